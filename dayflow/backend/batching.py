@@ -0,0 +1,89 @@
+"""Cross-request micro-batching for expensive async calls.
+
+Concurrent callers ``submit`` small lists of items; the batcher holds them for
+a short window (or until ``max_batch`` items are queued), makes one call to
+``handler`` with everything collected, and hands each caller back its own
+slice of the results, in order.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger("dayflow")
+
+
+class MicroBatcher:
+    """Coalesce concurrent ``submit`` calls into batched ``handler`` calls.
+
+    ``handler`` receives the concatenated items, at most ``max_batch`` per call,
+    and must return one result per item. If a call raises, the callers with
+    items in that chunk get the exception; the others still get results.
+    """
+
+    def __init__(self, handler: Callable[[list], Awaitable[list]],
+                 window: float = 0.02, max_batch: int = 50):
+        self._handler = handler
+        self.window = window
+        self.max_batch = max_batch
+        self._pending: list[tuple[list, asyncio.Future]] = []
+        self._pending_size = 0
+        self._timer: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def submit(self, items: list) -> list:
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((list(items), fut))
+        self._pending_size += len(items)
+        if self._pending_size >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_size = self._pending, [], 0
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _call(self, chunk: list) -> list:
+        results = await self._handler(chunk)
+        if len(results) != len(chunk):
+            raise ValueError(f"batch handler returned {len(results)} results for {len(chunk)} items")
+        return results
+
+    async def _run(self, batch: list[tuple[list, asyncio.Future]]) -> None:
+        flat = [item for items, _ in batch for item in items]
+        # max_batch also caps each handler call, so one large caller can't
+        # make a huge call or fail the whole window with it
+        step = max(self.max_batch, 1)
+        chunks = await asyncio.gather(
+            *(self._call(flat[i:i + step]) for i in range(0, len(flat), step)),
+            return_exceptions=True,
+        )
+        failed = [c for c in chunks if isinstance(c, BaseException)]
+        if failed:
+            logger.warning("Batched call failed for %d of %d chunks: %s", len(failed), len(chunks), failed[0])
+
+        offset = 0
+        for items, fut in batch:
+            first, last = offset // step, (offset + len(items) - 1) // step
+            offset += len(items)
+            if fut.done():
+                continue
+            error = next((chunks[c] for c in range(first, last + 1) if isinstance(chunks[c], BaseException)), None)
+            if error is not None:
+                fut.set_exception(error)
+                continue
+            results = [r for c in range(first, last + 1) for r in chunks[c]]
+            start = (offset - len(items)) - first * step
+            fut.set_result(results[start:start + len(items)])
@@ -0,0 +1,107 @@
+"""Encode-time and size benchmark for a 100-diary /api/diary/history payload.
+
+Compares FastAPI's default path (jsonable_encoder + stdlib json) with
+FastJSONResponse (orjson, no encoder walk), and the wire size with gzip and
+brotli. Run from dayflow/backend:
+
+    python benchmarks/bench_history_payload.py
+"""
+
+import gzip
+import os
+import random
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+
+from responses import BROTLI_QUALITY, GZIP_LEVEL, FastJSONResponse, brotli  # noqa: E402
+
+EMOJIS = ["☕", "🍜", "🏃", "📚", "🛒", "🎬", "💼", "🍕", "🚌", "🎧"]
+WORDS = ("walked coffee met friend lunch ramen meeting deadline park sunset "
+         "groceries train movie library gym rain quiet evening").split()
+
+
+def _text(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def make_history(n_diaries: int = 100, seed: int = 7) -> list[dict]:
+    """Shape matches get_diary_history(summary=False)."""
+    rng = random.Random(seed)
+    diaries = []
+    for i in range(n_diaries):
+        diary_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        events = [
+            {
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "time": f"{8 + j:02d}:{rng.choice(['00', '15', '30', '45'])}",
+                "emoji": rng.choice(EMOJIS),
+                "title": _text(rng, 3).title(),
+                "spending": rng.choice([0, 0, 4, 12, 25, 60]),
+                "source": rng.choice(["calendar", "photo", "manual", None]),
+                "is_deleted": False,
+            }
+            for j in range(rng.randint(5, 12))
+        ]
+        photos = [
+            {
+                "url": f"https://example.supabase.co/storage/v1/object/public/photos/{uuid.uuid4()}.jpg",
+                "extracted_time": f"{9 + k:02d}:{rng.randint(0, 59):02d}",
+            }
+            for k in range(rng.randint(0, 6))
+        ]
+        diaries.append({
+            "id": diary_id,
+            "user_id": "00000000-0000-0000-0000-000000000001",
+            "date": f"2024-{1 + i // 28:02d}-{1 + i % 28:02d}",
+            "diary_text": _text(rng, 220),
+            "diary_preview": _text(rng, 20),
+            "spending_insight": _text(rng, 40),
+            "tomorrow_suggestion": _text(rng, 30),
+            "total_spending": sum(e["spending"] for e in events),
+            "primary_emoji": events[0]["emoji"],
+            "thumb_event_id": events[0]["id"],
+            "photo_url": photos[0]["url"] if photos else None,
+            "created_at": f"2024-01-01T21:{i % 60:02d}:00.000000+00:00",
+            "timeline_events": events,
+            "photos": photos,
+        })
+    return diaries
+
+
+def _best(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / number * 1000
+
+
+def main() -> None:
+    payload = make_history()
+    number = 50
+
+    before = JSONResponse(jsonable_encoder(payload)).body
+    after = FastJSONResponse(payload).body
+    t_before = _best(lambda: JSONResponse(jsonable_encoder(payload)).body, number)
+    t_after = _best(lambda: FastJSONResponse(payload).body, number)
+
+    print(f"100-diary history payload ({sum(len(d['timeline_events']) for d in payload)} events)")
+    print(f"{'':28}{'bytes':>10}{'encode ms':>12}")
+    print(f"{'jsonable_encoder + json':28}{len(before):>10}{t_before:>12.2f}")
+    print(f"{'FastJSONResponse (orjson)':28}{len(after):>10}{t_after:>12.2f}")
+
+    t_gzip = _best(lambda: gzip.compress(after, compresslevel=GZIP_LEVEL), number)
+    print(f"{f'+ gzip (level {GZIP_LEVEL})':28}{len(gzip.compress(after, GZIP_LEVEL)):>10}{t_gzip:>12.2f}")
+    if brotli is not None:
+        t_br = _best(lambda: brotli.compress(after, quality=BROTLI_QUALITY), number)
+        size = len(brotli.compress(after, quality=BROTLI_QUALITY))
+        print(f"{f'+ brotli (quality {BROTLI_QUALITY})':28}{size:>10}{t_br:>12.2f}")
+    else:
+        print("+ brotli: not installed (pip install brotli)")
+    print(f"encode speedup: {t_before / t_after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
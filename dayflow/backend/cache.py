@@ -0,0 +1,238 @@
+"""In-process caches used in front of LLM calls and hot DB reads.
+
+``LRUCache`` is a size-bounded (optionally TTL-bounded) memory cache.
+``PersistentCache`` is an SQLite key/value file that survives restarts, and
+``TieredCache`` layers the two: memory first, then disk, promoting hits.
+Set ``CACHE_DB_PATH`` to enable the persistent tier and ``CACHE_DB_MAX_ROWS``
+to bound it per namespace.
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "")
+CACHE_DB_MAX_ROWS = int(os.getenv("CACHE_DB_MAX_ROWS", "100000"))
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional per-entry TTL (seconds).
+
+    Besides ``maxsize`` entries, the cache can be bounded by total weight:
+    with ``weigh`` (value -> int, e.g. bytes) and ``maxweight`` set, the
+    oldest entries are evicted until the total fits, and a value heavier than
+    ``maxweight`` on its own is not cached.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None,
+                 maxweight: int | None = None, weigh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.maxweight = maxweight
+        self._weigh = weigh
+        self.weight = 0
+        self._data: OrderedDict = OrderedDict()  # key -> (value, expires_at, weight)
+        self._lock = threading.Lock()
+
+    def _drop(self, key) -> tuple:
+        item = self._data.pop(key)
+        self.weight -= item[2]
+        return item
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                return default
+            value, expires_at, _ = item
+            if expires_at is not None and expires_at < time.monotonic():
+                self._drop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float | None = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        weight = self._weigh(value) if self._weigh is not None else 0
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            if self.maxweight is not None and weight > self.maxweight:
+                return
+            self._data[key] = (value, expires_at, weight)
+            self.weight += weight
+            while len(self._data) > self.maxsize or (
+                self.maxweight is not None and self.weight > self.maxweight
+            ):
+                self._drop(next(iter(self._data)))
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            return self._drop(key)[0]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def items(self) -> list[tuple]:
+        """Snapshot of live (key, value) pairs, oldest first."""
+        now = time.monotonic()
+        with self._lock:
+            return [(k, v) for k, (v, exp, _) in self._data.items() if exp is None or exp >= now]
+
+    def __contains__(self, key) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class PersistentCache:
+    """JSON values in an SQLite file, partitioned by namespace.
+
+    Expired rows are purged at startup and on every write; with ``max_rows``
+    set, the least recently written rows beyond it are dropped too.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl: float | None = None,
+                 max_rows: int | None = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("pragma journal_mode = wal")
+        self._conn.execute(
+            "create table if not exists cache ("
+            " namespace text not null, key text not null, value text not null, expires_at real,"
+            " primary key (namespace, key))"
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            self._prune()
+
+    def _prune(self) -> None:
+        # insert or replace gives a rewritten row a fresh rowid, so rowid order is write order
+        self._conn.execute(
+            "delete from cache where namespace = ? and expires_at < ?", (self.namespace, time.time()),
+        )
+        if self.max_rows is not None:
+            self._conn.execute(
+                "delete from cache where rowid in (select rowid from cache where namespace = ?"
+                " order by rowid desc limit -1 offset ?)",
+                (self.namespace, self.max_rows),
+            )
+
+    def get_many(self, keys: list[str]) -> dict:
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self._conn.execute(
+                    f"select key, value, expires_at from cache where namespace = ? "
+                    f"and key in ({', '.join('?' * len(chunk))})",
+                    [self.namespace, *chunk],
+                )
+                for key, value, expires_at in rows:
+                    if expires_at is None or expires_at >= now:
+                        found[key] = json.loads(value)
+        return found
+
+    def set_many(self, items: dict) -> None:
+        if not items:
+            return
+        expires_at = time.time() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._conn.executemany(
+                "insert or replace into cache (namespace, key, value, expires_at) values (?, ?, ?, ?)",
+                [(self.namespace, k, json.dumps(v), expires_at) for k, v in items.items()],
+            )
+            self._prune()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("delete from cache where namespace = ? and key = ?", (self.namespace, key))
+
+
+class TieredCache:
+    """Memory LRU in front of an optional PersistentCache."""
+
+    def __init__(self, namespace: str, maxsize: int = 1024, ttl: float | None = None,
+                 path: str | None = None, max_rows: int | None = None):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        path = CACHE_DB_PATH if path is None else path
+        max_rows = CACHE_DB_MAX_ROWS if max_rows is None else max_rows
+        self.disk = PersistentCache(path, namespace, ttl=ttl, max_rows=max_rows) if path else None
+
+    def _from_memory(self, keys: list[str]) -> tuple[dict, list[str]]:
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.memory.get(key, _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        return found, missing
+
+    def _promote(self, found: dict, from_disk: dict) -> dict:
+        for key, value in from_disk.items():
+            self.memory.set(key, value)
+            found[key] = value
+        return found
+
+    def get_many(self, keys: list[str]) -> dict:
+        found, missing = self._from_memory(keys)
+        if missing and self.disk is not None:
+            self._promote(found, self.disk.get_many(missing))
+        return found
+
+    def set_many(self, items: dict) -> None:
+        for key, value in items.items():
+            self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set_many(items)
+
+    def get(self, key: str, default=None):
+        return self.get_many([key]).get(key, default)
+
+    def set(self, key: str, value) -> None:
+        self.set_many({key: value})
+
+    def delete(self, key: str) -> None:
+        self.memory.pop(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    # Async variants for the event loop: memory hits stay inline, SQLite
+    # reads/writes run in a worker thread
+
+    async def aget_many(self, keys: list[str]) -> dict:
+        found, missing = self._from_memory(keys)
+        if missing and self.disk is not None:
+            self._promote(found, await asyncio.to_thread(self.disk.get_many, missing))
+        return found
+
+    async def aset_many(self, items: dict) -> None:
+        for key, value in items.items():
+            self.memory.set(key, value)
+        if items and self.disk is not None:
+            await asyncio.to_thread(self.disk.set_many, items)
+
+    async def aget(self, key: str, default=None):
+        return (await self.aget_many([key])).get(key, default)
+
+    async def aset(self, key: str, value) -> None:
+        await self.aset_many({key: value})
@@ -1,17 +1,75 @@
+import asyncio
+import hashlib
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+import loaders
+from cache import LRUCache
+
 load_dotenv()
 
-SUPABASE_URL = os.environ["SUPABASE_URL"]
-SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ["SUPABASE_ANON_KEY"]
+# "supabase" (default) talks to the hosted project; "sqlite" / "memory" use the
+# local engine in local_db.py, which implements the same client surface.
+DB_BACKEND = os.environ.get("DB_BACKEND", "supabase").lower()
+
+
+def _create_client():
+    """Build the storage backend selected by DB_BACKEND."""
+    if DB_BACKEND in ("sqlite", "memory"):
+        from local_db import create_local_client
+        path = os.environ.get("LOCAL_DB_PATH", "dayflow.db") if DB_BACKEND == "sqlite" else ":memory:"
+        return create_local_client(path)
+    if DB_BACKEND != "supabase":
+        raise RuntimeError(f"Unknown DB_BACKEND: {DB_BACKEND}")
+    url = os.environ["SUPABASE_URL"]
+    key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") or os.environ["SUPABASE_ANON_KEY"]
+    return create_client(url, key)
+
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# One client for the whole process: its PostgREST/Storage sessions are pooled
+# httpx clients, so every worker thread below shares the same keep-alive
+# connections instead of opening its own.
+supabase: Client = _create_client()
 
 PHOTO_BUCKET = "photos"
 
+# supabase-py is synchronous, so queries run on a bounded thread pool to keep
+# the event loop free. Keep this at or below the httpx keep-alive pool size.
+DB_MAX_WORKERS = int(os.environ.get("DB_MAX_WORKERS", "16"))
+_db_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="db")
+
+
+async def _run(fn, *args, **kwargs):
+    """Run a blocking client call on the DB thread pool and await its result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, partial(fn, *args, **kwargs))
+
+
+async def _execute(query):
+    """Execute a PostgREST query builder off the event loop."""
+    return await _run(query.execute)
+
+
+# Values per ``in.(...)`` filter; PostgREST filters travel in the URL, so long
+# id lists are split into batches of this size.
+IN_FILTER_BATCH = int(os.environ.get("IN_FILTER_BATCH", "200"))
+
+
+def _batches(values: list, size: int = IN_FILTER_BATCH) -> list[list]:
+    return [values[i:i + size] for i in range(0, len(values), size)]
+
+
+async def _execute_in(make_query, values: list) -> list:
+    """Run ``make_query(batch)`` for each batch of ``values`` and concatenate the rows."""
+    results = await asyncio.gather(*(_execute(make_query(b)) for b in _batches(list(values))))
+    return [row for r in results for row in r.data]
+
 
 def _extract_hhmm(time_str: str) -> str:
     """Extract HH:MM from various time formats.
@@ -33,44 +91,178 @@ def _extract_hhmm(time_str: str) -> str:
 
 async def test_connection() -> dict:
     """Simple read-only check to verify Supabase connectivity."""
-    result = supabase.table("diaries").select("id").limit(1).execute()
+    result = await _execute(supabase.table("diaries").select("id").limit(1))
     return {"ok": True, "count": len(result.data)}
 
 
+# ── Change tracking ─────────────────────────────────────────────────
+# Per-user data versions, bumped by every write in this module. Response
+# caches compare them, so any write invalidates that user's cached reads.
+# Versions live in this process only.
+_user_versions: dict[str, int] = {}
+
+
+def user_version(user_id: str) -> int:
+    """Current data version for a user (changes on every write)."""
+    return _user_versions.get(user_id, 0)
+
+
+def _touch_user(user_id: str | None) -> None:
+    if user_id:
+        _user_versions[user_id] = _user_versions.get(user_id, 0) + 1
+
+
+async def _touch_diary(diary_id: str | None) -> None:
+    """Bump the version of the user who owns a diary (owner lookup is cached)."""
+    if diary_id:
+        _touch_user(await get_diary_owner(diary_id))
+
+
+def _remember_diary(diary: dict) -> dict:
+    """Seed the owner cache and this request's identity map from a diary row."""
+    if diary.get("id") and diary.get("user_id"):
+        _diary_owner_cache.set(diary["id"], diary["user_id"])
+    if diary.get("date"):
+        loaders.prime(("diary", diary.get("user_id"), diary["date"]), diary)
+    return diary
+
+
 # ── Diaries ─────────────────────────────────────────────────────────
 
+async def _get_or_create_rows(user_id: str, dates: list[str]) -> list[dict]:
+    """Race-free get-or-create of the user's diaries for ``dates`` in one RPC."""
+    result = await _execute(
+        supabase.rpc("get_or_create_diaries", {"p_user_id": user_id, "p_dates": list(dict.fromkeys(dates))})
+    )
+    rows = result.data or []
+    if any(r.pop("created", False) for r in rows):
+        _touch_user(user_id)
+    return [_remember_diary(r) for r in rows]
+
+
 async def get_or_create_diary(date: str, user_id: str | None = None) -> dict:
     """Return existing diary for a date (and user_id if given), or create a draft one."""
-    query = supabase.table("diaries").select("*").eq("date", date)
-    if user_id:
-        query = query.eq("user_id", user_id)
-    result = query.limit(1).execute()
-    if result.data and len(result.data) > 0:
+    async def fetch():
+        if user_id:
+            return (await _get_or_create_rows(user_id, [date]))[0]
+
+        # Diaries without an owner aren't covered by the unique index
+        result = await _execute(supabase.table("diaries").select("*").eq("date", date).limit(1))
+        if result.data and len(result.data) > 0:
+            return result.data[0]
+        result = await _execute(supabase.table("diaries").insert({"date": date}))
         return result.data[0]
 
-    row = {"date": date}
-    if user_id:
-        row["user_id"] = user_id
-    result = supabase.table("diaries").insert(row).execute()
-    return result.data[0]
+    # Memoized per request, so concurrent callers share one round trip
+    return _remember_diary(await loaders.load(("diary", user_id, date), fetch))
+
+
+async def get_or_create_diaries(dates: list[str], user_id: str) -> dict[str, str]:
+    """Map each date to the user's diary id, creating missing drafts (one round trip)."""
+    if not dates:
+        return {}
+    return {r["date"]: r["id"] for r in await _get_or_create_rows(user_id, dates)}
+
+
+def _event_key(event: dict) -> str:
+    """Stable identity of a timeline event within its diary."""
+    if event.get("event_key"):
+        return event["event_key"]
+    source = event.get("source") or "generated"
+    if event.get("source_id"):
+        return f"{source}:{event['source_id']}"
+    digest = hashlib.sha1(f"{event.get('time')}|{event.get('title')}".encode()).hexdigest()[:16]
+    return f"{source}:{digest}"
+
+
+def _keyed_timeline_rows(diary_id: str | None, events: list[dict]) -> list[dict]:
+    """Timeline rows for one diary, each with a unique stable event_key."""
+    rows, seen = [], {}
+    for e in events:
+        row = _clean_timeline_row(diary_id, e)
+        key = _event_key(row)
+        # Identical events in one payload get distinct, still-stable keys
+        seen[key] = seen.get(key, 0) + 1
+        row["event_key"] = key if seen[key] == 1 else f"{key}#{seen[key]}"
+        rows.append(row)
+    return rows
 
 
-async def save_diary(date: str, diary_data: dict) -> dict:
-    """Save or update a diary entry for a given date.
+async def save_diary_graph(date: str, diary_data: dict, events: list[dict]) -> dict:
+    """Upsert a diary and merge its timeline events in one transactional RPC.
 
-    If diary_data contains an 'id', it upserts by primary key.
-    Otherwise, finds existing diary for the date (and user_id) and updates it, or creates new one.
+    diary_data must carry user_id. Events are matched by event_key, so a
+    retried save updates the same rows instead of inserting duplicates.
+    Returns the diary row with the saved events under "timeline_events".
     """
-    row = {"date": date, **diary_data}
-    user_id = row.get("user_id")
-    if "id" in row:
-        result = supabase.table("diaries").upsert(row, on_conflict="id").execute()
-    else:
-        # Check if diary already exists for this date + user
-        existing = await get_or_create_diary(date, user_id=user_id)
-        row["id"] = existing["id"]
-        result = supabase.table("diaries").upsert(row, on_conflict="id").execute()
-    return result.data[0]
+    rows = [{k: v for k, v in r.items() if k != "diary_id"} for r in _keyed_timeline_rows(None, events)]
+    result = await _execute(
+        supabase.rpc("save_diary_graph", {"p_diary": {"date": date, **diary_data}, "p_events": rows})
+    )
+    saved = result.data
+    _touch_user(saved.get("user_id"))
+    _remember_diary({k: v for k, v in saved.items() if k != "timeline_events"})
+    return saved
+
+
+# ── Bulk import ─────────────────────────────────────────────────────
+
+DIARY_IMPORT_FIELDS = ("diary_text", "diary_preview", "spending_insight", "tomorrow_suggestion",
+                       "primary_emoji", "thumb_event_id", "photo_url")
+# Every bulk timeline row carries the same columns (PostgREST bulk writes need
+# uniform keys). is_deleted is left out so a re-import keeps user deletions.
+_IMPORT_EVENT_COLUMNS = ("diary_id", "event_key", "time", "emoji", "title", "description",
+                         "location", "source", "source_id", "spending", "category", "photo_url",
+                         "photo_analysis", "sort_order")
+
+
+async def upsert_diaries(user_id: str, diaries: list[dict]) -> dict[str, str]:
+    """Bulk get-or-create diaries by (user_id, date), writing their fields.
+
+    Only the DIARY_IMPORT_FIELDS present in each dict are written, so an
+    existing diary keeps the rest. Rows are grouped by which fields they
+    carry (bulk upserts need uniform keys): one round trip per group.
+    Dates must be unique within the list. Returns date -> diary id.
+    """
+    groups: dict[tuple, list[dict]] = {}
+    for d in diaries:
+        fields = tuple(f for f in DIARY_IMPORT_FIELDS if f in d)
+        groups.setdefault(fields, []).append(
+            {"user_id": user_id, "date": d["date"], **{f: d[f] for f in fields}}
+        )
+    if not groups:
+        return {}
+    results = await asyncio.gather(*(
+        _execute(supabase.table("diaries").upsert(rows, on_conflict="user_id,date"))
+        for rows in groups.values()
+    ))
+    saved = [r for result in results for r in result.data]
+    _touch_user(user_id)
+    for r in saved:
+        _diary_owner_cache.set(r["id"], user_id)
+    return {r["date"]: r["id"] for r in saved}
+
+
+def import_timeline_rows(diary_id: str, events: list[dict]) -> list[dict]:
+    """Uniform, keyed timeline rows for upsert_timeline_events."""
+    rows = []
+    for row in _keyed_timeline_rows(diary_id, events):
+        row = {c: row.get(c) for c in _IMPORT_EVENT_COLUMNS}
+        row["spending"] = round(row["spending"] or 0)
+        rows.append(row)
+    return rows
+
+
+async def upsert_timeline_events(rows: list[dict]) -> int:
+    """Insert or update timeline rows keyed on (diary_id, event_key). Returns rows written."""
+    if not rows:
+        return 0
+    result = await _execute(
+        supabase.table("timeline_events").upsert(rows, on_conflict="diary_id,event_key")
+    )
+    for diary_id in {r["diary_id"] for r in rows}:
+        await _touch_diary(diary_id)
+    return len(result.data)
 
 
 async def get_diary(date: str, user_id: str | None = None) -> dict | None:
@@ -82,7 +274,7 @@ async def get_diary(date: str, user_id: str | None = None) -> dict | None:
     )
     if user_id:
         query = query.eq("user_id", user_id)
-    result = query.limit(1).execute()
+    result = await _execute(query.limit(1))
     if result.data and len(result.data) > 0:
         return result.data[0]
     return None
@@ -97,49 +289,110 @@ async def get_diary_by_id(diary_id: str, user_id: str | None = None) -> dict | N
     )
     if user_id:
         query = query.eq("user_id", user_id)
-    result = query.limit(1).execute()
+    result = await _execute(query.limit(1))
     if result.data and len(result.data) > 0:
         return result.data[0]
     return None
 
 
-async def get_diary_history(limit: int = 30, user_id: str | None = None) -> list:
-    """Fetch the most recent diary entries with their timeline events and photos (excluding soft-deleted)."""
-    query = (
-        supabase.table("diaries")
-        .select("*, timeline_events(id, time, emoji, title, spending, source, is_deleted), photos(url, extracted_time)")
-    )
-    if user_id:
-        query = query.eq("user_id", user_id)
-    result = query.order("date", desc=True).limit(limit).execute()
-    # Filter out soft-deleted timeline events and set primary photo
-    for diary in result.data:
-        if diary.get("timeline_events"):
-            diary["timeline_events"] = [
-                e for e in diary["timeline_events"] if not e.get("is_deleted")
-            ]
-        # Set photo_url to first photo's URL if available
-        photos = diary.get("photos", [])
-        if photos and len(photos) > 0:
-            # Sort photos by extracted_time if available, then pick first
-            sorted_photos = sorted(photos, key=lambda p: p.get("extracted_time") or "00:00")
-            diary["photo_url"] = sorted_photos[0].get("url")
-        else:
-            diary["photo_url"] = None
+async def get_diary_history(
+    limit: int = 30, user_id: str | None = None, before: str | None = None, summary: bool = False,
+) -> list:
+    """Fetch diary entries dated before ``before`` (newest first), excluding soft-deleted events.
+
+    Full entries carry their timeline events and photos; ``summary`` returns
+    only the card fields (id, date, preview, primary_emoji, total_spending,
+    photo_url). The cover photo_url is picked in the database.
+    """
+    result = await _execute(supabase.rpc("get_diary_history", {
+        "p_user_id": user_id,
+        "p_before": before,
+        "p_limit": limit,
+        "p_summary": summary,
+    }))
+    return result.data or []
+
+
+async def get_spending_analytics(user_id: str, start: str, end: str, window: int = 7) -> dict:
+    """Spending rollups for [start, end], aggregated in the database.
+
+    Returns zero-filled daily totals with a trailing ``window``-day rolling
+    average, weekly (ISO week) and monthly totals, and per-category and
+    per-source breakdowns. Soft-deleted events are excluded.
+    """
+    result = await _execute(supabase.rpc("get_spending_analytics", {
+        "p_user_id": user_id,
+        "p_start": start,
+        "p_end": end,
+        "p_window": window,
+    }))
     return result.data
 
 
+async def iter_diary_archive(user_id: str, page_size: int = 50):
+    """Yield every diary of a user, newest first, for export.
+
+    Each diary carries its active timeline events (by time), photos and
+    calendar events. Pages are read by date keyset, so only one page is in
+    memory at a time.
+    """
+    before = None
+    while True:
+        query = (
+            supabase.table("diaries")
+            .select("*, timeline_events(*), photos(*), calendar_events(*)")
+            .eq("user_id", user_id)
+        )
+        if before:
+            query = query.lt("date", before)
+        page = (await _execute(query.order("date", desc=True).limit(page_size))).data
+        for diary in page:
+            diary["timeline_events"] = sorted(
+                (e for e in diary.get("timeline_events") or [] if not e.get("is_deleted")),
+                key=lambda e: e.get("time") or "",
+            )
+            yield diary
+        if len(page) < page_size:
+            return
+        before = page[-1]["date"]
+
+
+# A diary's owner never changes, so diary_id -> user_id is safe to cache until
+# the diary is deleted. Only found owners are cached.
+DIARY_OWNER_CACHE_SIZE = int(os.environ.get("DIARY_OWNER_CACHE_SIZE", "10000"))
+_diary_owner_cache = LRUCache(maxsize=DIARY_OWNER_CACHE_SIZE)
+
+
+async def get_diary_owner(diary_id: str) -> str | None:
+    """Return the user_id that owns a diary, or None if it doesn't exist."""
+    owner = _diary_owner_cache.get(diary_id)
+    if owner is not None:
+        return owner
+    result = await _execute(
+        supabase.table("diaries").select("user_id").eq("id", diary_id).limit(1)
+    )
+    owner = result.data[0]["user_id"] if result.data else None
+    if owner is not None:
+        _diary_owner_cache.set(diary_id, owner)
+    return owner
+
+
 async def delete_diary(diary_id: str, user_id: str | None = None) -> bool:
     """Delete a diary entry by ID. Cascade deletes timeline_events, photos, etc."""
+    owner = user_id or await get_diary_owner(diary_id)
     query = supabase.table("diaries").delete().eq("id", diary_id)
     if user_id:
         query = query.eq("user_id", user_id)
-    query.execute()
+    await _execute(query)
+    _diary_owner_cache.pop(diary_id)
+    loaders.forget()
+    _touch_user(owner)
     return True
 
 
 TIMELINE_FIELDS = {"time", "emoji", "title", "description", "location", "source", "source_id",
-                    "spending", "is_deleted", "photo_url", "photo_analysis", "sort_order"}
+                    "spending", "category", "is_deleted", "photo_url", "photo_analysis", "sort_order",
+                    "event_key"}
 
 
 def _clean_timeline_row(diary_id: str, event: dict) -> dict:
@@ -153,25 +406,14 @@ def _clean_timeline_row(diary_id: str, event: dict) -> dict:
 
 # ── Timeline Events ─────────────────────────────────────────────────
 
-async def save_timeline_events(diary_id: str, events: list[dict]) -> list:
-    """Bulk-insert timeline events linked to a diary entry."""
-    rows = [_clean_timeline_row(diary_id, e) for e in events]
-    for r in rows:
-        if "spending" in r:
-            r["spending"] = round(r["spending"])
-    result = supabase.table("timeline_events").insert(rows).execute()
-    return result.data
-
-
 async def get_active_timeline(diary_id: str) -> list:
     """Return timeline events that are not soft-deleted, sorted by time."""
-    result = (
+    result = await _execute(
         supabase.table("timeline_events")
         .select("*")
         .eq("diary_id", diary_id)
         .eq("is_deleted", False)
         .order("time")
-        .execute()
     )
     return result.data
 
@@ -182,65 +424,107 @@ async def add_manual_event(diary_id: str, event: dict) -> dict:
     row.setdefault("spending", 0)
     if "spending" in row:
         row["spending"] = round(row["spending"])
-    result = supabase.table("timeline_events").insert(row).execute()
+    result = await _execute(supabase.table("timeline_events").insert(row))
+    await _touch_diary(diary_id)
     return result.data[0]
 
 
 async def soft_delete_event(event_id: str) -> dict:
     """Soft-delete a timeline event (set is_deleted=true)."""
-    result = (
+    result = await _execute(
         supabase.table("timeline_events")
         .update({"is_deleted": True})
         .eq("id", event_id)
-        .execute()
     )
+    if result.data:
+        await _touch_diary(result.data[0]["diary_id"])
     return {"success": True}
 
 
 async def update_spending(event_id: str, amount: float) -> dict:
-    """Update the spending amount on a timeline event."""
-    result = (
+    """Update the spending amount on a timeline event.
+
+    The diary's total_spending follows via the timeline_events trigger.
+    """
+    result = await _execute(
         supabase.table("timeline_events")
         .update({"spending": round(amount)})
         .eq("id", event_id)
-        .execute()
     )
+    await _touch_diary(result.data[0]["diary_id"])
     return result.data[0]
 
 
 # ── Calendar Events ──────────────────────────────────────────────────
 
+def _calendar_row(date: str, ev: dict, diary_id: str | None = None) -> dict:
+    """Build a calendar_events row from a CalendarEvent-shaped dict."""
+    row = {"date": date, **ev}
+    # Remove fields not in calendar_events table schema
+    row.pop("emoji", None)
+    # Convert short time "10:00" to full ISO timestamp for start_time/end_time
+    for field in ("start_time", "end_time"):
+        val = row.get(field)
+        if val and len(val) <= 5:  # e.g. "10:00"
+            row[field] = f"{date}T{val}:00"
+    if diary_id:
+        row["diary_id"] = diary_id
+    return row
+
+
+def _calendar_timeline_row(diary_id: str | None, e: dict, sort_order: int) -> dict:
+    """Build the timeline_events row that mirrors a calendar event."""
+    return {
+        "diary_id": diary_id,
+        "time": _extract_hhmm(e.get("start_time", e.get("time", "12:00"))),
+        "emoji": e.get("emoji", "📅"),
+        "title": e.get("title", ""),
+        "description": e.get("description", ""),
+        "location": e.get("location"),
+        "source": "calendar",
+        "source_id": e.get("calendar_id"),
+        "spending": 0,
+        "is_deleted": False,
+        "sort_order": sort_order,
+    }
+
+
 async def save_calendar_events(date: str, events: list[dict], diary_id: str | None = None) -> list:
     """Save Google Calendar events for a date.
 
-    Deletes existing events for the date first, then inserts fresh.
-    This avoids partial-index issues with on_conflict.
+    Diffs against stored rows by calendar_id in one transactional RPC: new
+    events are inserted, changed ones updated in place, and events that
+    vanished from the date are deleted. Returns the day's saved rows.
     """
-    # clear old events for this date+diary, then bulk-insert
-    query = supabase.table("calendar_events").delete().eq("date", date)
-    if diary_id:
-        query = query.eq("diary_id", diary_id)
-    query.execute()
-    # Also delete by calendar_id to avoid unique constraint violations from multi-day events
-    cal_ids = [ev.get("calendar_id") for ev in events if ev.get("calendar_id")]
-    if cal_ids:
-        supabase.table("calendar_events").delete().in_("calendar_id", cal_ids).execute()
+    rows = [_calendar_row(date, ev, diary_id) for ev in events]
+    result = await _execute(
+        supabase.rpc("save_calendar_events", {"p_date": date, "p_diary_id": diary_id, "p_events": rows})
+    )
+    await _touch_diary(diary_id)
+    return result.data["events"]
 
-    rows = []
-    for ev in events:
-        row = {"date": date, **ev}
-        # Remove fields not in calendar_events table schema
-        row.pop("emoji", None)
-        # Convert short time "10:00" to full ISO timestamp for start_time/end_time
-        for field in ("start_time", "end_time"):
-            val = row.get(field)
-            if val and len(val) <= 5:  # e.g. "10:00"
-                row[field] = f"{date}T{val}:00"
-        if diary_id:
-            row["diary_id"] = diary_id
-        rows.append(row)
 
-    result = supabase.table("calendar_events").insert(rows).execute()
+async def save_calendar_range(events_by_date: dict[str, list[dict]], diary_ids: dict[str, str]) -> dict:
+    """Bulk save_calendar_events + save_calendar_as_timeline across many days.
+
+    Same diff/dedup semantics as the per-day functions, in one transactional
+    RPC. A date mapped to an empty list clears that day's calendar events.
+    Returns {date: {"saved": n, "timeline_inserted": m}}.
+    """
+    days = [
+        {
+            "date": d,
+            "diary_id": diary_ids[d],
+            "events": [_calendar_row(d, ev, diary_ids[d]) for ev in evs],
+            "timeline": [_calendar_timeline_row(None, ev, i) for i, ev in enumerate(evs)],
+        }
+        for d, evs in events_by_date.items()
+    ]
+    if not days:
+        return {}
+    result = await _execute(supabase.rpc("save_calendar_range", {"p_days": days}))
+    for day in days:
+        await _touch_diary(day["diary_id"])
     return result.data
 
 
@@ -253,7 +537,7 @@ async def get_calendar_events(date: str, diary_id: str | None = None) -> list:
     )
     if diary_id:
         query = query.eq("diary_id", diary_id)
-    result = query.order("start_time").execute()
+    result = await _execute(query.order("start_time"))
     return result.data
 
 
@@ -262,63 +546,249 @@ async def delete_calendar_events(date: str, diary_id: str | None = None) -> None
     query = supabase.table("calendar_events").delete().eq("date", date)
     if diary_id:
         query = query.eq("diary_id", diary_id)
-    query.execute()
+    await _execute(query)
+    await _touch_diary(diary_id)
+
+
+# ── Calendar Sync (incremental) ──────────────────────────────────────
+
+async def get_calendar_sync_token(user_id: str, calendar_id: str) -> str | None:
+    """Return the stored Google nextSyncToken for a user's calendar, if any."""
+    result = await _execute(
+        supabase.table("calendar_sync_state")
+        .select("sync_token")
+        .eq("user_id", user_id)
+        .eq("calendar_id", calendar_id)
+        .limit(1)
+    )
+    return result.data[0]["sync_token"] if result.data else None
+
+
+async def save_calendar_sync_token(user_id: str, calendar_id: str, sync_token: str | None) -> None:
+    """Store (or clear) the Google nextSyncToken for a user's calendar."""
+    await _execute(
+        supabase.table("calendar_sync_state").upsert(
+            {
+                "user_id": user_id,
+                "calendar_id": calendar_id,
+                "sync_token": sync_token,
+                "synced_at": datetime.now(timezone.utc).isoformat(),
+            },
+            on_conflict="user_id,calendar_id",
+        )
+    )
+
+
+async def get_diary_ids_by_date(user_id: str, dates: list[str]) -> dict[str, str]:
+    """Map date -> diary id for the user's existing diaries on the given dates."""
+    if not dates:
+        return {}
+    rows = await _execute_in(
+        lambda batch: supabase.table("diaries").select("id, date").eq("user_id", user_id).in_("date", batch),
+        dates,
+    )
+    return {r["date"]: r["id"] for r in rows}
+
+
+async def has_calendar_timeline(diary_id: str) -> bool:
+    """Whether any calendar-sourced timeline row (deleted or not) exists for a diary."""
+    result = await _execute(
+        supabase.table("timeline_events").select("id")
+        .eq("diary_id", diary_id).eq("source", "calendar").limit(1)
+    )
+    return bool(result.data)
+
+
+async def apply_calendar_delta(
+    user_id: str, diary_ids: dict[str, str], changed: list[dict], cancelled_ids: list[str],
+) -> dict:
+    """Apply changed/cancelled Google events to calendar_events and the calendar timeline.
+
+    ``changed`` events carry a local ``date``; only dates present in ``diary_ids``
+    are written. Timeline rows are updated in place (keeping the user's spending
+    and deletions); events that moved to another day are re-created there.
+    Costs a fixed number of round trips regardless of how many events changed,
+    and leaves the user's cache version alone when nothing was written.
+    """
+    changed = [e for e in changed if e.get("calendar_id") and e.get("date") in diary_ids]
+    changed_ids = [e["calendar_id"] for e in changed]
+
+    # Scope cancellations to this user's diaries
+    cancelled_diary_ids: set[str] = set()
+    owned_cancelled: list[str] = []
+    if cancelled_ids:
+        rows = await _execute_in(
+            lambda batch: supabase.table("calendar_events").select("calendar_id, diary_id").in_("calendar_id", batch),
+            cancelled_ids,
+        )
+        candidate = list({r["diary_id"] for r in rows if r.get("diary_id")})
+        if candidate:
+            owned = await _execute_in(
+                lambda batch: supabase.table("diaries").select("id").eq("user_id", user_id).in_("id", batch),
+                candidate,
+            )
+            cancelled_diary_ids = {r["id"] for r in owned}
+            owned_cancelled = [r["calendar_id"] for r in rows if r.get("diary_id") in cancelled_diary_ids]
+
+    # Filter by source_id in batches, then keep rows in any of the user's
+    # diaries: an event that moved here from a day outside diary_ids still
+    # has its old row there, which must be soft-deleted
+    owned_ids = set(diary_ids.values()) | cancelled_diary_ids
+    touched = changed_ids + list(cancelled_ids)
+    existing = []
+    if touched:
+        existing = await _execute_in(
+            lambda batch: supabase.table("timeline_events")
+            .select("id, diary_id, source_id, spending, is_deleted")
+            .eq("source", "calendar")
+            .in_("source_id", batch),
+            touched,
+        )
+    unknown = list({r["diary_id"] for r in existing} - owned_ids)
+    if unknown:
+        owned = await _execute_in(
+            lambda batch: supabase.table("diaries").select("id").eq("user_id", user_id).in_("id", batch),
+            unknown,
+        )
+        owned_ids |= {r["id"] for r in owned}
+    existing_by_source = {r["source_id"]: r for r in existing if r["diary_id"] in owned_ids}
+
+    # calendar_events: replace changed rows, drop cancelled ones
+    stale_cal_ids = changed_ids + owned_cancelled
+    if stale_cal_ids:
+        await _execute_in(
+            lambda batch: supabase.table("calendar_events").delete().in_("calendar_id", batch), stale_cal_ids,
+        )
+    if changed:
+        await _execute(supabase.table("calendar_events").insert(
+            [_calendar_row(e["date"], e, diary_ids[e["date"]]) for e in changed]
+        ))
+
+    # timeline_events: update in place, insert new, soft-delete cancelled/moved
+    updates, inserts, soft_deletes = [], [], []
+    for i, e in enumerate(changed):
+        row = _calendar_timeline_row(diary_ids[e["date"]], e, i)
+        prev = existing_by_source.get(e["calendar_id"])
+        if prev and prev["diary_id"] == row["diary_id"]:
+            updates.append({**row, "id": prev["id"], "spending": prev["spending"], "is_deleted": prev["is_deleted"]})
+        else:
+            inserts.append(row)
+            if prev:
+                soft_deletes.append(prev["id"])
+    soft_deletes += [existing_by_source[c]["id"] for c in cancelled_ids if c in existing_by_source]
+
+    if updates:
+        await _execute(supabase.table("timeline_events").upsert(updates, on_conflict="id"))
+    if inserts:
+        await _execute(supabase.table("timeline_events").insert(inserts))
+    if soft_deletes:
+        await _execute_in(
+            lambda batch: supabase.table("timeline_events").update({"is_deleted": True}).in_("id", batch),
+            soft_deletes,
+        )
+    if stale_cal_ids or changed or soft_deletes:
+        _touch_user(user_id)
+    return {"changed": len(changed), "cancelled": len(soft_deletes)}
 
 
 # ── Photos ───────────────────────────────────────────────────────────
 
-async def save_photo_event(diary_id: str, photo: dict) -> dict:
+def _photo_row(diary_id: str, photo: dict) -> dict:
+    """Build a photos row from an analyzed photo payload."""
+    return {
+        "diary_id": diary_id,
+        "url": photo.get("photo_url") or photo.get("url", ""),
+        "thumbnail_url": photo.get("thumbnail_url"),
+        "ai_analysis": photo.get("ai_analysis") or photo.get("description", ""),
+        "extracted_time": photo.get("extracted_time") or photo.get("time"),
+        "extracted_location": photo.get("extracted_location") or photo.get("location"),
+    }
+
+
+def _photo_timeline_row(diary_id: str, photo: dict, photo_id: str) -> dict:
+    """Build the timeline_events row that mirrors a saved photo."""
+    return {
+        "diary_id": diary_id,
+        "time": photo.get("extracted_time") or photo.get("time") or "12:00",
+        "emoji": photo.get("emoji", "📸"),
+        "title": photo.get("title", "Photo moment"),
+        "description": photo.get("description") or (photo.get("ai_analysis") or "")[:100],
+        "location": photo.get("extracted_location") or photo.get("location"),
+        "source": "photo",
+        "source_id": photo_id,
+        "photo_url": photo.get("photo_url") or photo.get("url", ""),
+        "photo_analysis": photo.get("ai_analysis") or photo.get("description", ""),
+        "spending": 0,
+        "is_deleted": False,
+    }
+
+
+async def save_photo_event(diary_id: str, photo: dict, photo_id: str | None = None) -> dict:
     """Save a photo to the photos table AND create a timeline_event for it."""
     # 1. Insert into photos table
-    photo_result = (
-        supabase.table("photos")
-        .insert({
-            "diary_id": diary_id,
-            "url": photo.get("photo_url") or photo.get("url", ""),
-            "thumbnail_url": photo.get("thumbnail_url"),
-            "ai_analysis": photo.get("ai_analysis") or photo.get("description", ""),
-            "extracted_time": photo.get("extracted_time") or photo.get("time"),
-            "extracted_location": photo.get("extracted_location") or photo.get("location"),
-        })
-        .execute()
-    )
+    row = _photo_row(diary_id, photo)
+    if photo_id is not None:
+        row["id"] = photo_id
+    photo_result = await _execute(supabase.table("photos").insert(row))
     photo_row = photo_result.data[0]
 
     # 2. Insert into timeline_events
-    event_result = (
-        supabase.table("timeline_events")
-        .insert({
-            "diary_id": diary_id,
-            "time": photo.get("extracted_time") or photo.get("time") or "12:00",
-            "emoji": photo.get("emoji", "📸"),
-            "title": photo.get("title", "Photo moment"),
-            "description": photo.get("description") or (photo.get("ai_analysis") or "")[:100],
-            "location": photo.get("extracted_location") or photo.get("location"),
-            "source": "photo",
-            "source_id": photo_row["id"],
-            "photo_url": photo.get("photo_url") or photo.get("url", ""),
-            "photo_analysis": photo.get("ai_analysis") or photo.get("description", ""),
-            "spending": 0,
-            "is_deleted": False,
-        })
-        .execute()
+    event_result = await _execute(
+        supabase.table("timeline_events").insert(_photo_timeline_row(diary_id, photo, photo_row["id"]))
     )
     event_row = event_result.data[0]
 
+    await _touch_diary(diary_id)
     return {"photo": photo_row, "event": event_row}
 
 
+async def save_photo_events(diary_id: str, photos: list[dict]) -> list[dict]:
+    """Save many photos and their timeline events in one transactional RPC.
+
+    Returns one result per input photo, in order: {"ok": True, "photo", "event"}
+    or {"ok": False, "error"}. If the bulk call fails, each photo is retried
+    individually with the same photo ids, so a batch that did commit (e.g. the
+    call timed out afterwards) conflicts instead of being duplicated.
+    """
+    if not photos:
+        return []
+    photo_rows = [{"id": str(uuid.uuid4()), **_photo_row(diary_id, p)} for p in photos]
+    event_rows = [
+        _photo_timeline_row(diary_id, p, row["id"]) for p, row in zip(photos, photo_rows)
+    ]
+    try:
+        result = await _execute(
+            supabase.rpc("save_photo_events", {"p_photos": photo_rows, "p_events": event_rows})
+        )
+    except Exception:
+        results = await asyncio.gather(
+            *(save_photo_event(diary_id, p, row["id"]) for p, row in zip(photos, photo_rows)),
+            return_exceptions=True,
+        )
+        return [
+            {"ok": False, "error": str(r)} if isinstance(r, Exception) else {"ok": True, **r}
+            for r in results
+        ]
+
+    saved_photos = {r["id"]: r for r in result.data["photos"]}
+    saved_events = {r["source_id"]: r for r in result.data["events"]}
+    await _touch_diary(diary_id)
+    return [
+        {"ok": True, "photo": saved_photos[row["id"]], "event": saved_events[row["id"]]}
+        for row in photo_rows
+    ]
+
+
 async def save_calendar_as_timeline(diary_id: str, events: list[dict]) -> dict:
     """Save calendar events into timeline_events with source='calendar' and dedup by source_id."""
     # Get existing calendar source_ids for this diary
-    existing = (
+    existing = (await _execute(
         supabase.table("timeline_events")
         .select("source_id")
         .eq("diary_id", diary_id)
         .eq("source", "calendar")
         .eq("is_deleted", False)
-        .execute()
-    ).data
+    )).data
     existing_ids = {e["source_id"] for e in existing if e.get("source_id")}
 
     # Filter out duplicates
@@ -326,48 +796,35 @@ async def save_calendar_as_timeline(diary_id: str, events: list[dict]) -> dict:
     if not new_events:
         return {"inserted": 0, "events": []}
 
-    rows = []
-    for i, e in enumerate(new_events):
-        rows.append({
-            "diary_id": diary_id,
-            "time": _extract_hhmm(e.get("start_time", e.get("time", "12:00"))),
-            "emoji": e.get("emoji", "📅"),
-            "title": e.get("title", ""),
-            "description": e.get("description", ""),
-            "location": e.get("location"),
-            "source": "calendar",
-            "source_id": e.get("calendar_id"),
-            "spending": 0,
-            "is_deleted": False,
-            "sort_order": i,
-        })
-
-    result = supabase.table("timeline_events").insert(rows).execute()
+    rows = [_calendar_timeline_row(diary_id, e, i) for i, e in enumerate(new_events)]
+    result = await _execute(supabase.table("timeline_events").insert(rows))
+    await _touch_diary(diary_id)
     return {"inserted": len(result.data), "events": result.data}
 
 
 async def save_photo(diary_id: str, photo_data: dict) -> dict:
     """Save a photo record linked to a diary entry."""
     row = {"diary_id": diary_id, **photo_data}
-    result = supabase.table("photos").insert(row).execute()
+    result = await _execute(supabase.table("photos").insert(row))
+    await _touch_diary(diary_id)
     return result.data[0]
 
 
 async def save_photos(diary_id: str, photos: list[dict]) -> list:
     """Bulk-insert photo records linked to a diary entry."""
     rows = [{"diary_id": diary_id, **p} for p in photos]
-    result = supabase.table("photos").insert(rows).execute()
+    result = await _execute(supabase.table("photos").insert(rows))
+    await _touch_diary(diary_id)
     return result.data
 
 
 async def get_photos(diary_id: str) -> list:
     """Fetch all photos for a diary entry."""
-    result = (
+    result = await _execute(
         supabase.table("photos")
         .select("*")
         .eq("diary_id", diary_id)
         .order("extracted_time")
-        .execute()
     )
     return result.data
 
@@ -378,12 +835,14 @@ async def upload_photo_to_storage(file_bytes: bytes, filename: str, content_type
     """Upload an image to Supabase Storage and return the public URL."""
     ext = filename.rsplit(".", 1)[-1] if "." in filename else "jpg"
     path = f"{uuid.uuid4().hex}.{ext}"
-    supabase.storage.from_(PHOTO_BUCKET).upload(
+    bucket = supabase.storage.from_(PHOTO_BUCKET)
+    await _run(
+        bucket.upload,
         path,
         file_bytes,
         file_options={"content-type": content_type},
     )
-    public_url = supabase.storage.from_(PHOTO_BUCKET).get_public_url(path)
+    public_url = bucket.get_public_url(path)
     return public_url
 
 
@@ -398,24 +857,25 @@ async def save_thumb(diary_id: str, event_id: str, user_id: str | None = None) -
     )
     if user_id:
         query = query.eq("user_id", user_id)
-    result = query.execute()
-    return result.data[0]
+    result = await _execute(query)
+    _touch_user(result.data[0].get("user_id"))
+    return _remember_diary(result.data[0])
 
 
 # ── Users ────────────────────────────────────────────────────────────
 
 async def get_user(user_id: str) -> dict | None:
     """Fetch user profile by auth user_id (UUID)."""
-    result = (
-        supabase.table("users")
-        .select("*")
-        .eq("user_id", user_id)
-        .limit(1)
-        .execute()
-    )
-    if result.data and len(result.data) > 0:
-        return result.data[0]
-    return None
+    async def fetch():
+        result = await _execute(
+            supabase.table("users")
+            .select("*")
+            .eq("user_id", user_id)
+            .limit(1)
+        )
+        return result.data[0] if result.data else None
+
+    return await loaders.load(("user", user_id), fetch)
 
 
 async def create_or_update_user(user_id: str, user_data: dict) -> dict:
@@ -425,53 +885,36 @@ async def create_or_update_user(user_id: str, user_data: dict) -> dict:
     user_data.pop("google_token", None)
     user_data.pop("user_id", None)
 
-    existing = await get_user(user_id)
-
-    if existing:
-        row = {**user_data}
-        result = (
-            supabase.table("users")
-            .update(row)
-            .eq("user_id", user_id)
-            .execute()
-        )
-        return result.data[0]
-    else:
-        row = {"user_id": user_id, **user_data}
-        result = supabase.table("users").insert(row).execute()
-        return result.data[0]
+    # Only the given columns are written on conflict, so one upsert covers both cases
+    result = await _execute(
+        supabase.table("users").upsert({"user_id": user_id, **user_data}, on_conflict="user_id")
+    )
+    loaders.prime(("user", user_id), result.data[0])
+    return result.data[0]
 
 
 # ── Google OAuth Token (DB storage) ──────────────────────────────
 
 async def save_google_token(user_id: str, token_data: dict) -> dict:
-    """Save Google OAuth token JSON to the users table."""
-    existing = await get_user(user_id)
-    if existing:
-        result = (
-            supabase.table("users")
-            .update({"google_token": token_data})
-            .eq("user_id", user_id)
-            .execute()
-        )
-        return result.data[0]
-    else:
-        result = (
-            supabase.table("users")
-            .insert({"user_id": user_id, "google_token": token_data})
-            .execute()
-        )
-        return result.data[0]
+    """Save Google OAuth token JSON to the users table (single upsert by user_id)."""
+    result = await _execute(
+        supabase.table("users")
+        .upsert({"user_id": user_id, "google_token": token_data}, on_conflict="user_id")
+    )
+    loaders.prime(("user", user_id), result.data[0])
+    return result.data[0]
 
 
 async def get_google_token(user_id: str) -> dict | None:
     """Load Google OAuth token JSON from the users table."""
-    result = (
+    user = loaders.peek(("user", user_id))
+    if user is not None:
+        return user.get("google_token") or None
+    result = await _execute(
         supabase.table("users")
         .select("google_token")
         .eq("user_id", user_id)
         .limit(1)
-        .execute()
     )
     if result.data and result.data[0].get("google_token"):
         return result.data[0]["google_token"]
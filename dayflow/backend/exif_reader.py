@@ -0,0 +1,247 @@
+"""Header-only EXIF reader for capture time and GPS.
+
+Parses just the EXIF (TIFF) block — the JPEG APP1 segment, the PNG ``eXIf``
+or WebP ``EXIF`` chunk, or the HEIC ``Exif`` item — straight from the upload
+bytes, without decoding pixels or building Pillow's full tag dict. Only the
+tags the timeline needs are read: DateTimeOriginal/DateTimeDigitized and GPS.
+"""
+
+import asyncio
+import logging
+import struct
+
+logger = logging.getLogger("dayflow")
+
+# APP1 is at most 64 KB and sits right after SOI, so JPEG/PNG never need more.
+HEADER_SCAN_BYTES = 128 * 1024
+
+_EXIF_IFD = 0x8769
+_GPS_IFD = 0x8825
+_DATETIME_ORIGINAL = 0x9003
+_DATETIME_DIGITIZED = 0x9004
+
+_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+
+# ── Container parsing: find the TIFF block ──────────────────────────
+
+def _jpeg_tiff(raw: bytes) -> memoryview | None:
+    view = memoryview(raw)[:HEADER_SCAN_BYTES]
+    pos = 2
+    while pos + 4 <= len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:  # fill byte
+            pos += 1
+            continue
+        if marker in (0xD9, 0xDA):  # EOI / start of scan: no more metadata
+            return None
+        length = struct.unpack_from(">H", view, pos + 2)[0]
+        if marker == 0xE1 and bytes(view[pos + 4:pos + 10]) == b"Exif\x00\x00":
+            return view[pos + 10:pos + 2 + length]
+        pos += 2 + length
+    return None
+
+
+def _png_tiff(raw: bytes) -> memoryview | None:
+    view = memoryview(raw)
+    pos = 8
+    while pos + 8 <= len(view):
+        length, ctype = struct.unpack_from(">I4s", view, pos)
+        if ctype == b"eXIf":
+            return view[pos + 8:pos + 8 + length]
+        if ctype in (b"IDAT", b"IEND"):
+            return None
+        pos += 12 + length
+    return None
+
+
+def _webp_tiff(raw: bytes) -> memoryview | None:
+    view = memoryview(raw)
+    pos = 12
+    while pos + 8 <= len(view):
+        ctype, length = struct.unpack_from("<4sI", view, pos)
+        if ctype == b"EXIF":
+            data = view[pos + 8:pos + 8 + length]
+            return data[6:] if bytes(data[:6]) == b"Exif\x00\x00" else data
+        pos += 8 + length + (length & 1)
+    return None
+
+
+def _boxes(view: memoryview, start: int, end: int):
+    """Yield (type, payload_start, box_end) for ISO-BMFF boxes in [start, end)."""
+    pos = start
+    while pos + 8 <= end:
+        size, btype = struct.unpack_from(">I4s", view, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", view, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header:
+            return
+        yield btype, pos + header, pos + size
+        pos += size
+
+
+def _heif_tiff(raw: bytes) -> memoryview | None:
+    """Locate the Exif item via meta/iinf + iloc and return its TIFF block."""
+    view = memoryview(raw)
+    meta = next(((s, e) for t, s, e in _boxes(view, 0, len(view)) if t == b"meta"), None)
+    if meta is None:
+        return None
+    exif_item = None
+    locations: dict[int, tuple[int, int]] = {}
+    for btype, start, end in _boxes(view, meta[0] + 4, meta[1]):  # meta is a full box
+        if btype == b"iinf":
+            version = view[start]
+            count_fmt, count_len = (">H", 2) if version == 0 else (">I", 4)
+            for itype, istart, _ in _boxes(view, start + 4 + count_len, end):
+                if itype != b"infe" or view[istart] < 2:
+                    continue
+                id_fmt, id_len = (">H", 2) if view[istart] == 2 else (">I", 4)
+                item_id = struct.unpack_from(id_fmt, view, istart + 4)[0]
+                if bytes(view[istart + 4 + id_len + 2:istart + 4 + id_len + 6]) == b"Exif":
+                    exif_item = item_id
+        elif btype == b"iloc":
+            version = view[start]
+            sizes = struct.unpack_from(">H", view, start + 4)[0]
+            off_size, len_size, base_size = sizes >> 12, (sizes >> 8) & 0xF, (sizes >> 4) & 0xF
+            idx_size = sizes & 0xF if version in (1, 2) else 0
+            pos = start + 6
+            if version < 2:
+                count = struct.unpack_from(">H", view, pos)[0]
+                pos += 2
+            else:
+                count = struct.unpack_from(">I", view, pos)[0]
+                pos += 4
+
+            def _read(n: int) -> int:
+                nonlocal pos
+                value = int.from_bytes(view[pos:pos + n], "big") if n else 0
+                pos += n
+                return value
+
+            for _ in range(count):
+                item_id = _read(2 if version < 2 else 4)
+                if version in (1, 2):
+                    pos += 2  # construction_method
+                pos += 2  # data_reference_index
+                base = _read(base_size)
+                extents = _read(2)
+                first = None
+                for _ in range(extents):
+                    _read(idx_size)
+                    offset, length = _read(off_size), _read(len_size)
+                    if first is None:
+                        first = (base + offset, length)
+                if first is not None:
+                    locations[item_id] = first
+    if exif_item is None or exif_item not in locations:
+        return None
+    offset, length = locations[exif_item]
+    if offset + 4 > len(view):
+        return None
+    # ExifDataBlock: 4-byte offset to the TIFF header, then the payload
+    skip = struct.unpack_from(">I", view, offset)[0]
+    return view[offset + 4 + skip:offset + length]
+
+
+def _find_tiff(raw: bytes) -> memoryview | None:
+    if raw[:2] == b"\xff\xd8":
+        return _jpeg_tiff(raw)
+    if raw[:8] == b"\x89PNG\r\n\x1a\n":
+        return _png_tiff(raw)
+    if raw[:4] == b"RIFF" and raw[8:12] == b"WEBP":
+        return _webp_tiff(raw)
+    if raw[4:8] == b"ftyp":
+        return _heif_tiff(raw)
+    # Unknown container: look for an Exif marker near the start
+    marker = raw.find(b"Exif\x00\x00", 0, HEADER_SCAN_BYTES)
+    return memoryview(raw)[marker + 6:] if marker >= 0 else None
+
+
+# ── TIFF parsing ─────────────────────────────────────────────────────
+
+def _read_ifd(tiff: memoryview, offset: int, endian: str, wanted: set[int]) -> dict:
+    """Read the ``wanted`` tags of one IFD as raw Python values."""
+    out: dict = {}
+    if offset + 2 > len(tiff):
+        return out
+    count = struct.unpack_from(endian + "H", tiff, offset)[0]
+    for i in range(count):
+        entry = offset + 2 + i * 12
+        if entry + 12 > len(tiff):
+            break
+        tag, typ, n = struct.unpack_from(endian + "HHI", tiff, entry)
+        if tag not in wanted or typ not in _TYPE_SIZES:
+            continue
+        size = _TYPE_SIZES[typ] * n
+        data_at = entry + 8 if size <= 4 else struct.unpack_from(endian + "I", tiff, entry + 8)[0]
+        if data_at + size > len(tiff):
+            continue
+        if typ == 2:
+            out[tag] = bytes(tiff[data_at:data_at + size]).split(b"\x00", 1)[0].decode("ascii", "replace")
+        elif typ in (5, 10):
+            fmt = endian + ("II" if typ == 5 else "ii") * n
+            vals = struct.unpack_from(fmt, tiff, data_at)
+            out[tag] = [(vals[j], vals[j + 1]) for j in range(0, len(vals), 2)]
+        elif typ in (3, 4, 9):
+            fmt = endian + {3: "H", 4: "I", 9: "i"}[typ] * n
+            vals = struct.unpack_from(fmt, tiff, data_at)
+            out[tag] = vals[0] if n == 1 else list(vals)
+    return out
+
+
+def _to_degrees(ref: str, values: list[tuple[int, int]]) -> float:
+    d, m, s = (num / den for num, den in values[:3])
+    dd = d + m / 60 + s / 3600
+    if ref in ("S", "W"):
+        dd = -dd
+    return round(dd, 6)
+
+
+def extract_exif(raw: bytes) -> dict:
+    """Extract time and GPS from EXIF data. Returns dict with 'time' and/or 'gps'."""
+    result: dict = {}
+    try:
+        tiff = _find_tiff(raw)
+        if tiff is None or len(tiff) < 8:
+            return result
+        endian = {b"II": "<", b"MM": ">"}.get(bytes(tiff[:2]))
+        if endian is None:
+            return result
+        ifd0 = _read_ifd(tiff, struct.unpack_from(endian + "I", tiff, 4)[0], endian, {_EXIF_IFD, _GPS_IFD})
+
+        if _EXIF_IFD in ifd0:
+            exif = _read_ifd(tiff, ifd0[_EXIF_IFD], endian, {_DATETIME_ORIGINAL, _DATETIME_DIGITIZED})
+            # Format: "2025:01:15 14:30:00"; DateTimeOriginal is preferred
+            value = exif.get(_DATETIME_ORIGINAL) or exif.get(_DATETIME_DIGITIZED)
+            if isinstance(value, str) and len(value) >= 16 and " " in value:
+                result["time"] = value.split(" ")[1][:5]  # "14:30"
+                result["datetime_original"] = value
+
+        if _GPS_IFD in ifd0:
+            gps = _read_ifd(tiff, ifd0[_GPS_IFD], endian, {1, 2, 3, 4})
+            try:
+                lat, lon = gps.get(2), gps.get(4)
+                if lat and lon:
+                    result["gps"] = {
+                        "lat": _to_degrees(gps.get(1, "N"), lat),
+                        "lon": _to_degrees(gps.get(3, "E"), lon),
+                    }
+            except (TypeError, IndexError, ZeroDivisionError):
+                pass
+    except Exception as e:
+        logger.debug("EXIF extraction failed for image: %s", e)
+
+    return result
+
+
+async def extract_exif_batch(raws: list[bytes]) -> list[dict]:
+    """Extract EXIF for a whole upload in one hop off the event loop."""
+    if not raws:
+        return []
+    return await asyncio.to_thread(lambda: [extract_exif(r) for r in raws])
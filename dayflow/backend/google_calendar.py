@@ -0,0 +1,211 @@
+"""Google Calendar API access that stays off the event loop.
+
+The discovery document is loaded once and a single ``Resource`` is built
+from it; each call then executes on a small thread pool with the user's
+credentials attached per request. Every worker thread keeps its own
+``httplib2.Http`` (httplib2 is not thread-safe), so connections to Google
+are reused across calls instead of rebuilt for every request.
+
+``CredentialCache`` keeps each user's OAuth credentials in memory so status
+checks and fetches skip the users table, and refreshes tokens at most once
+per user no matter how many requests race for them.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache, partial
+
+import httplib2
+from google.auth.transport.requests import Request as GoogleRequest
+from google.oauth2.credentials import Credentials
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+
+from cache import LRUCache
+
+logger = logging.getLogger("dayflow")
+
+GOOGLE_MAX_WORKERS = int(os.getenv("GOOGLE_MAX_WORKERS", "8"))
+GOOGLE_HTTP_TIMEOUT = float(os.getenv("GOOGLE_HTTP_TIMEOUT", "20"))
+
+_google_executor = ThreadPoolExecutor(max_workers=GOOGLE_MAX_WORKERS, thread_name_prefix="gcal")
+_thread_local = threading.local()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking Google client call on the Google thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_google_executor, partial(fn, *args, **kwargs))
+
+
+@lru_cache(maxsize=1)
+def calendar_service():
+    """Calendar v3 Resource built once from the bundled discovery document."""
+    doc = get_static_doc("calendar", "v3")
+    return build_from_document(json.loads(doc), http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+
+
+def _authorized_http(creds: Credentials) -> AuthorizedHttp:
+    """Wrap this thread's pooled Http with the caller's access token.
+
+    Only the token is attached, so the transport never refreshes on its own
+    (a 401 surfaces as HttpError); refreshes go through CredentialCache,
+    which single-flights and persists them.
+    """
+    http = getattr(_thread_local, "http", None)
+    if http is None:
+        http = _thread_local.http = httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT)
+    return AuthorizedHttp(Credentials(token=creds.token), http=http, refresh_status_codes=())
+
+
+def _list_events_sync(creds: Credentials, calendar_id: str, params: dict) -> dict:
+    """Fetch every page of events().list; returns items plus nextSyncToken."""
+    events = calendar_service().events()
+    http = _authorized_http(creds)
+    items: list = []
+    page_token = None
+    while True:
+        page = events.list(calendarId=calendar_id, pageToken=page_token, **params).execute(http=http)
+        items.extend(page.get("items", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return {"items": items, "nextSyncToken": page.get("nextSyncToken")}
+
+
+async def list_events(creds: Credentials, calendar_id: str, **params) -> dict:
+    """List calendar events (all pages) without blocking the event loop."""
+    return await run_blocking(_list_events_sync, creds, calendar_id, params)
+
+
+async def refresh_credentials(creds: Credentials) -> None:
+    """Refresh an access token in place, off the event loop."""
+    await run_blocking(creds.refresh, GoogleRequest())
+
+
+# ── Credentials cache ────────────────────────────────────────────────
+
+GOOGLE_CREDS_TTL = float(os.getenv("GOOGLE_CREDS_TTL", "600"))
+GOOGLE_REFRESH_MARGIN = float(os.getenv("GOOGLE_REFRESH_MARGIN", "300"))
+
+
+def _expires_within(creds: Credentials, seconds: float) -> bool:
+    if creds.expiry is None:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    remaining = creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)
+    return remaining.total_seconds() <= seconds
+
+
+class CredentialCache:
+    """Per-user Credentials with single-flight loads and refreshes.
+
+    ``load(user_id)`` returns stored token JSON (or None) and
+    ``save(user_id, token_json)`` persists it; both are only called on a
+    cache miss or after a refresh. Concurrent callers for the same user
+    share one in-flight load/refresh.
+    """
+
+    def __init__(self, load, save, scopes: list[str], ttl: float = GOOGLE_CREDS_TTL,
+                 refresh_margin: float = GOOGLE_REFRESH_MARGIN, maxsize: int = 10000):
+        self._load = load
+        self._save = save
+        self._scopes = scopes
+        self.refresh_margin = refresh_margin
+        # user_id -> Credentials, or False for "no token stored"
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+
+    async def _single_flight(self, kind: str, user_id: str, factory):
+        key = (kind, user_id)
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(factory())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(fut)
+
+    async def _load_creds(self, user_id: str) -> Credentials | None:
+        token_data = await self._load(user_id)
+        creds = Credentials.from_authorized_user_info(token_data, self._scopes) if token_data else None
+        self._cache.set(user_id, creds or False)
+        return creds
+
+    async def _refresh(self, user_id: str, creds: Credentials) -> Credentials:
+        await refresh_credentials(creds)
+        await self._save(user_id, json.loads(creds.to_json()))
+        self._cache.set(user_id, creds)
+        return creds
+
+    async def get(self, user_id: str) -> Credentials | None:
+        """Return usable credentials for a user, refreshing if expired."""
+        try:
+            creds = self._cache.get(user_id)
+            if creds is None:
+                creds = await self._single_flight("load", user_id, lambda: self._load_creds(user_id))
+            if not creds:
+                return None
+            if creds.expired and creds.refresh_token:
+                creds = await self._single_flight("refresh", user_id, lambda: self._refresh(user_id, creds))
+            return creds
+        except Exception as e:
+            logger.warning("Google credentials unavailable for user %s: %s", user_id, e)
+            self._cache.pop(user_id)
+            return None
+
+    async def reauthorize(self, user_id: str, creds: Credentials, stale_token: str | None) -> Credentials | None:
+        """Refresh after Google rejected ``stale_token`` (HTTP 401).
+
+        Callers that raced on the same stale token share one refresh; if it was
+        already replaced, the current credentials are returned as-is. Returns
+        None when the token cannot be refreshed.
+        """
+        if creds.token != stale_token:
+            return creds
+        if not creds.refresh_token:
+            self._cache.pop(user_id)
+            return None
+        try:
+            return await self._single_flight("refresh", user_id, lambda: self._refresh(user_id, creds))
+        except Exception as e:
+            logger.warning("Google token refresh after 401 failed for user %s: %s", user_id, e)
+            self._cache.pop(user_id)
+            return None
+
+    async def put(self, user_id: str, creds: Credentials) -> None:
+        """Persist freshly issued credentials and cache them."""
+        await self._save(user_id, json.loads(creds.to_json()))
+        self._cache.set(user_id, creds)
+
+    def invalidate(self, user_id: str) -> None:
+        self._cache.pop(user_id)
+
+    async def refresh_expiring(self) -> int:
+        """Refresh cached tokens that expire within refresh_margin. Returns count."""
+        due = [
+            (user_id, creds) for user_id, creds in self._cache.items()
+            if creds and creds.refresh_token and _expires_within(creds, self.refresh_margin)
+        ]
+        results = await asyncio.gather(
+            *(self._single_flight("refresh", u, lambda u=u, c=c: self._refresh(u, c)) for u, c in due),
+            return_exceptions=True,
+        )
+        for (user_id, _), res in zip(due, results):
+            if isinstance(res, Exception):
+                logger.warning("Proactive token refresh failed for user %s: %s", user_id, res)
+                self._cache.pop(user_id)
+        return len(due)
+
+    async def run_refresher(self, interval: float = 60) -> None:
+        """Background loop that keeps cached tokens ahead of expiry."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_expiring()
+            except Exception:
+                logger.exception("Credential refresher iteration failed")
@@ -0,0 +1,97 @@
+"""Image preprocessing before vision analysis.
+
+Phone uploads are often 5-12 MB. The vision model gains nothing from full
+resolution, so images are decoded, downscaled to ``IMAGE_MAX_EDGE``, stripped
+of metadata and re-encoded before being base64-encoded into the request.
+Pillow's decode/resize work runs in a process pool so it neither blocks the
+event loop nor contends for the GIL.
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger("dayflow")
+
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1568"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_MIME_BY_FORMAT = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # Never fork the server itself: it holds thread pools and DB connections
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _pool
+
+
+def shutdown_pool() -> None:
+    """Stop the worker processes (called on app shutdown)."""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def downscale_image(raw: bytes, max_edge: int, fmt: str, quality: int) -> bytes:
+    """Decode, orient, downscale and re-encode an image without metadata."""
+    from PIL import Image, ImageOps
+
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+    except ImportError:
+        pass
+
+    img = Image.open(io.BytesIO(raw))
+    # Let the JPEG decoder skip detail we are about to throw away
+    img.draft("RGB", (max_edge, max_edge))
+    # Bake the EXIF orientation into pixels before the metadata is dropped
+    img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, format=fmt, quality=quality, optimize=True)
+    return out.getvalue()
+
+
+async def preprocess_image(raw: bytes, mime: str) -> tuple[bytes, str]:
+    """Return a compact re-encoded copy of ``raw`` for the vision model.
+
+    Falls back to the original bytes if decoding fails or nothing is saved.
+    """
+    global _pool
+    fmt = IMAGE_FORMAT if IMAGE_FORMAT in _MIME_BY_FORMAT else "JPEG"
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        out = await loop.run_in_executor(pool, downscale_image, raw, IMAGE_MAX_EDGE, fmt, IMAGE_QUALITY)
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed); start a fresh pool on the next call
+        if _pool is pool:
+            logger.warning("Image worker pool broke, recreating it on next use")
+            _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        return raw, mime
+    except Exception as e:
+        logger.debug("Image preprocessing failed, sending original: %s", e)
+        return raw, mime
+
+    if len(out) >= len(raw):
+        logger.info("Image preprocess: %d bytes kept as-is (re-encode was %d)", len(raw), len(out))
+        return raw, mime
+    logger.info("Image preprocess: %d -> %d bytes (%.0f%%)", len(raw), len(out), 100 * len(out) / len(raw))
+    return out, _MIME_BY_FORMAT[fmt]
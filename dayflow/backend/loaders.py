@@ -0,0 +1,93 @@
+"""Request-scoped identity map for diary and user rows.
+
+main.py opens a ``request_scope()`` around every HTTP request. Inside it,
+``load(key, fetch)`` runs each distinct lookup at most once: concurrent and
+repeated callers for the same key share one DB round trip, and writes in
+db.py ``prime`` the map so later reads in the same request reuse the row they
+just wrote. Outside a request scope every call simply fetches.
+"""
+
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+
+class RequestLoader:
+    """Memoized, single-flight lookups keyed by tuples such as ("user", id)."""
+
+    def __init__(self):
+        self._futures: dict[tuple, asyncio.Future] = {}
+
+    async def load(self, key: tuple, fetch):
+        fut = self._futures.get(key)
+        if fut is None:
+            fut = self._futures[key] = asyncio.ensure_future(fetch())
+        try:
+            return await asyncio.shield(fut)
+        except Exception:
+            # Don't memoize failures; a later caller may retry
+            if self._futures.get(key) is fut:
+                del self._futures[key]
+            raise
+
+    def peek(self, key: tuple, default=None):
+        fut = self._futures.get(key)
+        if fut is None or not fut.done() or fut.cancelled() or fut.exception():
+            return default
+        return fut.result()
+
+    def prime(self, key: tuple, value) -> None:
+        fut = asyncio.get_running_loop().create_future()
+        fut.set_result(value)
+        self._futures[key] = fut
+
+    def forget(self, key: tuple) -> None:
+        self._futures.pop(key, None)
+
+    def clear(self) -> None:
+        self._futures.clear()
+
+
+_current: ContextVar[RequestLoader | None] = ContextVar("dayflow_request_loader", default=None)
+
+
+@contextmanager
+def request_scope():
+    """Install a fresh RequestLoader for the duration of one request."""
+    token = _current.set(RequestLoader())
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+async def load(key: tuple, fetch):
+    """Return the memoized result for ``key``, calling ``fetch()`` on a miss."""
+    loader = _current.get()
+    if loader is None:
+        return await fetch()
+    return await loader.load(key, fetch)
+
+
+def peek(key: tuple, default=None):
+    """A value already loaded in this request, without fetching."""
+    loader = _current.get()
+    return default if loader is None else loader.peek(key, default)
+
+
+def prime(key: tuple, value) -> None:
+    """Record a row this request just read or wrote."""
+    loader = _current.get()
+    if loader is not None:
+        loader.prime(key, value)
+
+
+def forget(key: tuple | None = None) -> None:
+    """Drop one key, or everything when ``key`` is None."""
+    loader = _current.get()
+    if loader is None:
+        return
+    if key is None:
+        loader.clear()
+    else:
+        loader.forget(key)
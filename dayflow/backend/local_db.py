@@ -0,0 +1,816 @@
+"""Local stand-in for the Supabase client, backed by SQLite.
+
+Implements the subset of the supabase-py surface that db.py uses —
+``table(...)`` query builders, ``storage.from_(...)`` and ``rpc(...)`` — on
+top of an SQLite database that mirrors the tables in ``sql/*.sql``. Select it
+with ``DB_BACKEND=sqlite`` (file at ``LOCAL_DB_PATH``) or ``DB_BACKEND=memory``
+to run and load-test the API without a Supabase project.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+
+SCHEMA = """
+create table if not exists diaries (
+  id                  text primary key,
+  user_id             text,
+  date                date not null,
+  diary_text          text,
+  diary_preview       text,
+  spending_insight    text,
+  tomorrow_suggestion text,
+  total_spending      integer default 0,
+  event_count         integer not null default 0,
+  primary_emoji       text,
+  thumb_event_id      text,
+  photo_url           text,
+  created_at          timestamptz default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+create index if not exists idx_diaries_user_id on diaries(user_id);
+create unique index if not exists diaries_user_id_date_key on diaries(user_id, date);
+
+create table if not exists timeline_events (
+  id             text primary key,
+  diary_id       text references diaries(id) on delete cascade,
+  time           text,
+  emoji          text,
+  title          text,
+  description    text,
+  location       text,
+  source         text,
+  source_id      text,
+  spending       integer default 0,
+  category       text,
+  is_deleted     boolean not null default 0,
+  photo_url      text,
+  photo_analysis text,
+  sort_order     integer,
+  event_key      text,
+  created_at     timestamptz default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+create index if not exists idx_timeline_events_diary_id on timeline_events(diary_id);
+create unique index if not exists timeline_events_diary_event_key
+  on timeline_events(diary_id, event_key);
+
+-- Row-level version of the statement triggers in sql/maintain_diary_totals.sql
+-- (SQLite has no transition tables); same deltas and primary_emoji rule.
+create trigger if not exists timeline_events_totals_insert
+after insert on timeline_events when not new.is_deleted
+begin
+  update diaries
+  set total_spending = coalesce(total_spending, 0) + coalesce(new.spending, 0),
+      event_count = event_count + 1
+  where id = new.diary_id;
+  update diaries
+  set primary_emoji = (
+    select e.emoji from timeline_events e
+    where e.diary_id = diaries.id and not e.is_deleted and e.emoji is not null
+    order by e.time, e.sort_order is null, e.sort_order
+    limit 1
+  )
+  where id = new.diary_id and primary_emoji is null;
+end;
+create trigger if not exists timeline_events_totals_delete
+after delete on timeline_events when not old.is_deleted
+begin
+  update diaries
+  set total_spending = coalesce(total_spending, 0) - coalesce(old.spending, 0),
+      event_count = event_count - 1
+  where id = old.diary_id;
+  update diaries
+  set primary_emoji = (
+    select e.emoji from timeline_events e
+    where e.diary_id = diaries.id and not e.is_deleted and e.emoji is not null
+    order by e.time, e.sort_order is null, e.sort_order
+    limit 1
+  )
+  where id = old.diary_id and (primary_emoji is null or (
+    primary_emoji = old.emoji and not exists (
+      select 1 from timeline_events e
+      where e.diary_id = diaries.id and not e.is_deleted and e.emoji = diaries.primary_emoji
+    )
+  ));
+end;
+create trigger if not exists timeline_events_totals_update
+after update of diary_id, spending, is_deleted, emoji, time on timeline_events
+begin
+  update diaries
+  set total_spending = coalesce(total_spending, 0) - coalesce(old.spending, 0),
+      event_count = event_count - 1
+  where id = old.diary_id and not old.is_deleted;
+  update diaries
+  set total_spending = coalesce(total_spending, 0) + coalesce(new.spending, 0),
+      event_count = event_count + 1
+  where id = new.diary_id and not new.is_deleted;
+  update diaries
+  set primary_emoji = (
+    select e.emoji from timeline_events e
+    where e.diary_id = diaries.id and not e.is_deleted and e.emoji is not null
+    order by e.time, e.sort_order is null, e.sort_order
+    limit 1
+  )
+  where id = old.diary_id and (not old.is_deleted and (primary_emoji is null or (
+    primary_emoji = old.emoji and not exists (
+      select 1 from timeline_events e
+      where e.diary_id = diaries.id and not e.is_deleted and e.emoji = diaries.primary_emoji
+    )
+  )));
+  update diaries
+  set primary_emoji = (
+    select e.emoji from timeline_events e
+    where e.diary_id = diaries.id and not e.is_deleted and e.emoji is not null
+    order by e.time, e.sort_order is null, e.sort_order
+    limit 1
+  )
+  where id = new.diary_id and primary_emoji is null;
+end;
+
+create table if not exists photos (
+  id                 text primary key,
+  diary_id           text references diaries(id) on delete cascade,
+  url                text,
+  thumbnail_url      text,
+  ai_analysis        text,
+  extracted_time     text,
+  extracted_location text,
+  created_at         timestamptz default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+create index if not exists idx_photos_diary_id on photos(diary_id);
+
+create table if not exists calendar_events (
+  id            text primary key,
+  diary_id      text references diaries(id) on delete cascade,
+  date          date not null,
+  title         text not null,
+  description   text,
+  start_time    timestamptz not null,
+  end_time      timestamptz,
+  location      text,
+  all_day       boolean default 0,
+  source        text default 'google_calendar',
+  calendar_id   text,
+  created_at    timestamptz default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+create index if not exists idx_calendar_events_date on calendar_events(date);
+create unique index if not exists idx_calendar_events_calendar_id
+  on calendar_events(calendar_id) where calendar_id is not null;
+
+create table if not exists calendar_sync_state (
+  user_id       text not null,
+  calendar_id   text not null,
+  sync_token    text,
+  synced_at     timestamptz default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+  primary key (user_id, calendar_id)
+);
+
+create table if not exists users (
+  user_id       text primary key,
+  email         text,
+  name          text,
+  gender        text,
+  age           integer,
+  calendar_url  text,
+  photo_url     text,
+  password_hash text,
+  google_token  jsonb,
+  created_at    timestamptz default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+  updated_at    timestamptz default (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+"""
+
+# Embedded resources: (parent, child) -> foreign-key column on the child.
+RELATIONS = {
+    ("diaries", "timeline_events"): "diary_id",
+    ("diaries", "photos"): "diary_id",
+    ("diaries", "calendar_events"): "diary_id",
+}
+
+
+@dataclass
+class LocalResponse:
+    data: list
+    count: int | None = None
+
+
+class LocalError(Exception):
+    """Raised for invalid queries, mirroring postgrest's APIError."""
+
+
+# Python implementations of the Postgres functions in sql/*.sql, keyed by name.
+# Each takes (client, params) and runs in a single transaction.
+RPCS: dict = {}
+
+
+def rpc_function(name: str):
+    """Register a local implementation of a Supabase RPC."""
+    def decorator(fn):
+        RPCS[name] = fn
+        return fn
+    return decorator
+
+
+class _LocalRpc:
+    def __init__(self, client: "LocalClient", fn: str, params: dict):
+        self._client = client
+        self._fn = fn
+        self._params = params
+
+    def execute(self) -> LocalResponse:
+        impl = RPCS.get(self._fn)
+        if impl is None:
+            raise LocalError(f"Could not find the function public.{self._fn}")
+        with self._client.transaction():
+            data = impl(self._client, self._params)
+        return LocalResponse(data)
+
+
+def _split_top_level(columns: str) -> list[str]:
+    """Split a PostgREST select string on commas that are not inside parentheses."""
+    parts, depth, current = [], 0, []
+    for ch in columns:
+        if ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        if ch == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(ch)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+_EMBED_RE = re.compile(r"^(\w+)\((.*)\)$", re.S)
+
+
+class LocalQuery:
+    """Chainable query builder with the same method names as postgrest-py."""
+
+    def __init__(self, client: "LocalClient", table: str):
+        self._client = client
+        self._table = table
+        self._op = "select"
+        self._columns = "*"
+        self._payload: list[dict] = []
+        self._on_conflict: str | None = None
+        self._ignore_duplicates = False
+        self._filters: list[tuple[str, str, object]] = []
+        self._order: list[tuple[str, bool]] = []
+        self._limit: int | None = None
+        self._offset = 0
+
+    # ── operations ──
+
+    def select(self, columns: str = "*", count: str | None = None) -> "LocalQuery":
+        self._op = "select"
+        self._columns = columns
+        return self
+
+    def insert(self, rows: dict | list[dict]) -> "LocalQuery":
+        self._op = "insert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows: dict | list[dict], on_conflict: str = "",
+               ignore_duplicates: bool = False) -> "LocalQuery":
+        self._op = "upsert"
+        self._payload = rows if isinstance(rows, list) else [rows]
+        self._on_conflict = on_conflict or None
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: dict) -> "LocalQuery":
+        self._op = "update"
+        self._payload = [values]
+        return self
+
+    def delete(self) -> "LocalQuery":
+        self._op = "delete"
+        return self
+
+    # ── filters / modifiers ──
+
+    def _filter(self, column: str, op: str, value) -> "LocalQuery":
+        self._filters.append((column, op, value))
+        return self
+
+    def eq(self, column: str, value) -> "LocalQuery":
+        return self._filter(column, "=", value)
+
+    def neq(self, column: str, value) -> "LocalQuery":
+        return self._filter(column, "!=", value)
+
+    def gt(self, column: str, value) -> "LocalQuery":
+        return self._filter(column, ">", value)
+
+    def gte(self, column: str, value) -> "LocalQuery":
+        return self._filter(column, ">=", value)
+
+    def lt(self, column: str, value) -> "LocalQuery":
+        return self._filter(column, "<", value)
+
+    def lte(self, column: str, value) -> "LocalQuery":
+        return self._filter(column, "<=", value)
+
+    def in_(self, column: str, values) -> "LocalQuery":
+        return self._filter(column, "in", list(values))
+
+    def is_(self, column: str, value) -> "LocalQuery":
+        return self._filter(column, "is", value)
+
+    def order(self, column: str, desc: bool = False) -> "LocalQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int) -> "LocalQuery":
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int) -> "LocalQuery":
+        self._offset = start
+        self._limit = end - start + 1
+        return self
+
+    def execute(self) -> LocalResponse:
+        return self._client._execute(self)
+
+
+class _LocalBucket:
+    def __init__(self, storage: "_LocalStorage", bucket: str):
+        self._storage = storage
+        self._bucket = bucket
+
+    def upload(self, path: str, file: bytes, file_options: dict | None = None) -> dict:
+        with self._storage.lock:
+            self._storage.objects[(self._bucket, path)] = bytes(file)
+        return {"path": path}
+
+    def get_public_url(self, path: str) -> str:
+        return f"{self._storage.base_url}/{self._bucket}/{path}"
+
+
+class _LocalStorage:
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.lock = threading.Lock()
+
+    def from_(self, bucket: str) -> _LocalBucket:
+        return _LocalBucket(self, bucket)
+
+
+class LocalClient:
+    """SQLite-backed client exposing ``table``, ``storage`` and ``rpc``."""
+
+    def __init__(self, path: str = ":memory:", storage_url: str = "http://localhost:8001/local-storage"):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("pragma foreign_keys = on")
+        if path != ":memory:":
+            self._conn.execute("pragma journal_mode = wal")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._columns = {
+            t: {r["name"]: (r["type"] or "").lower() for r in self._conn.execute(f"pragma table_info({t})")}
+            for (t,) in self._conn.execute("select name from sqlite_master where type = 'table'")
+        }
+        self.storage = _LocalStorage(storage_url)
+
+    def table(self, name: str) -> LocalQuery:
+        if name not in self._columns:
+            raise LocalError(f'relation "{name}" does not exist')
+        return LocalQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, fn: str, params: dict | None = None) -> _LocalRpc:
+        return _LocalRpc(self, fn, params or {})
+
+    # ── value conversion ──
+
+    def _to_db(self, table: str, column: str, value):
+        if column not in self._columns[table]:
+            raise LocalError(f"Could not find the '{column}' column of '{table}'")
+        if isinstance(value, bool):
+            return int(value)
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value
+
+    def _from_db(self, table: str, row: sqlite3.Row) -> dict:
+        out = {}
+        types = self._columns[table]
+        for key in row.keys():
+            value = row[key]
+            kind = types.get(key, "")
+            if value is not None and kind == "boolean":
+                value = bool(value)
+            elif value is not None and kind == "jsonb":
+                value = json.loads(value)
+            out[key] = value
+        return out
+
+    # ── SQL building ──
+
+    def _where(self, q: LocalQuery) -> tuple[str, list]:
+        clauses, params = [], []
+        for column, op, value in q._filters:
+            if column not in self._columns[q._table]:
+                raise LocalError(f"column {q._table}.{column} does not exist")
+            if op == "in":
+                if not value:
+                    clauses.append("0")
+                    continue
+                clauses.append(f'"{column}" in ({", ".join("?" * len(value))})')
+                params.extend(self._to_db(q._table, column, v) for v in value)
+            elif op == "is":
+                clauses.append(f'"{column}" is ' + ("null" if value in (None, "null") else "?"))
+                if value not in (None, "null"):
+                    params.append(self._to_db(q._table, column, value))
+            else:
+                clauses.append(f'"{column}" {op} ?')
+                params.append(self._to_db(q._table, column, value))
+        return (" where " + " and ".join(clauses)) if clauses else "", params
+
+    def _order_sql(self, table: str, order: list[tuple[str, bool]]) -> str:
+        if not order:
+            return ""
+        terms = []
+        for column, desc in order:
+            if column not in self._columns[table]:
+                raise LocalError(f"column {table}.{column} does not exist")
+            # Match Postgres: nulls sort last ascending, first descending
+            terms.append(f'"{column}" desc nulls first' if desc else f'"{column}" asc nulls last')
+        return " order by " + ", ".join(terms)
+
+    def _project(self, table: str, rows: list[dict], columns: str) -> list[dict]:
+        """Apply a PostgREST select list, resolving embedded child resources."""
+        plain, embeds = [], []
+        for part in _split_top_level(columns):
+            m = _EMBED_RE.match(part)
+            if m:
+                embeds.append((m.group(1), m.group(2)))
+            else:
+                plain.append(part)
+
+        for child, child_cols in embeds:
+            fk = RELATIONS.get((table, child))
+            if fk is None:
+                raise LocalError(f"Could not find a relationship between '{table}' and '{child}'")
+            grouped: dict[str, list] = {r["id"]: [] for r in rows}
+            if grouped:
+                ids = list(grouped)
+                sql = f'select * from "{child}" where "{fk}" in ({", ".join("?" * len(ids))})'
+                for raw in self._conn.execute(sql, ids):
+                    grouped[raw[fk]].append(self._from_db(child, raw))
+            for r in rows:
+                r[child] = self._project(child, grouped[r["id"]], child_cols)
+
+        if "*" in plain:
+            return rows
+        for col in plain:
+            if col not in self._columns[table]:
+                raise LocalError(f"column {table}.{col} does not exist")
+        keep = plain + [child for child, _ in embeds]
+        return [{c: r[c] for c in keep} for r in rows]
+
+    # ── execution ──
+
+    @contextmanager
+    def transaction(self):
+        """Run a block atomically; nests via savepoints like a Postgres function body."""
+        with self._lock:
+            name = f"sp{self._depth}"
+            self._conn.execute(f"savepoint {name}")
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._conn.execute(f"rollback to {name}")
+                self._conn.execute(f"release {name}")
+                raise
+            else:
+                self._conn.execute(f"release {name}")
+            finally:
+                self._depth -= 1
+
+    def _run_sql(self, sql: str, params: list) -> list:
+        try:
+            return self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            raise LocalError(str(e)) from e
+
+    def _execute(self, q: LocalQuery) -> LocalResponse:
+        with self._lock:
+            if q._op == "select":
+                return self._select(q)
+            if q._op in ("insert", "upsert"):
+                return self._insert(q)
+            if q._op == "update":
+                return self._update(q)
+            if q._op == "delete":
+                return self._delete(q)
+        raise LocalError(f"unsupported operation {q._op}")
+
+    def _select(self, q: LocalQuery) -> LocalResponse:
+        where, params = self._where(q)
+        sql = f'select * from "{q._table}"{where}{self._order_sql(q._table, q._order)}'
+        if q._limit is not None:
+            sql += f" limit {int(q._limit)} offset {int(q._offset)}"
+        rows = [self._from_db(q._table, r) for r in self._conn.execute(sql, params)]
+        return LocalResponse(self._project(q._table, rows, q._columns))
+
+    def _insert(self, q: LocalQuery) -> LocalResponse:
+        out = []
+        has_id = "id" in self._columns[q._table]
+        conflict = q._on_conflict
+        if q._op == "upsert" and not conflict:
+            conflict = "id" if has_id else next(iter(self._columns[q._table]))
+        with self.transaction():
+            for payload in q._payload:
+                row = dict(payload)
+                if has_id and not row.get("id"):
+                    row["id"] = str(uuid.uuid4())
+                cols = list(row)
+                values = [self._to_db(q._table, c, row[c]) for c in cols]
+                col_sql = ", ".join(f'"{c}"' for c in cols)
+                sql = f'insert into "{q._table}" ({col_sql}) values ({", ".join("?" * len(cols))})'
+                if q._op == "upsert":
+                    targets = [c.strip() for c in conflict.split(",")]
+                    updates = [c for c in cols if c not in targets and c != "id"] or targets[:1]
+                    if q._ignore_duplicates:
+                        sql += f' on conflict ({", ".join(targets)}) do nothing'
+                    else:
+                        sets = ", ".join(f'"{c}" = excluded."{c}"' for c in updates)
+                        sql += f' on conflict ({", ".join(targets)}) do update set {sets}'
+                out.extend(self._from_db(q._table, r) for r in self._run_sql(sql + " returning *", values))
+        return LocalResponse(out)
+
+    def _update(self, q: LocalQuery) -> LocalResponse:
+        values = q._payload[0]
+        cols = list(values)
+        if "updated_at" in self._columns[q._table] and "updated_at" not in values:
+            cols.append("updated_at")
+            values = {**values, "updated_at": datetime.now(timezone.utc).isoformat()}
+        where, params = self._where(q)
+        sets = ", ".join(f'"{c}" = ?' for c in cols)
+        sql = f'update "{q._table}" set {sets}{where} returning *'
+        rows = self._run_sql(sql, [self._to_db(q._table, c, values[c]) for c in cols] + params)
+        return LocalResponse([self._from_db(q._table, r) for r in rows])
+
+    def _delete(self, q: LocalQuery) -> LocalResponse:
+        where, params = self._where(q)
+        rows = self._run_sql(f'delete from "{q._table}"{where} returning *', params)
+        return LocalResponse([self._from_db(q._table, r) for r in rows])
+
+
+def create_local_client(path: str = ":memory:") -> LocalClient:
+    """Create a LocalClient for an SQLite file, or ``:memory:`` for a throwaway DB."""
+    return LocalClient(path)
+
+
+# ── RPC implementations (see sql/*.sql) ──────────────────────────────
+
+@rpc_function("save_photo_events")
+def _save_photo_events(client: LocalClient, params: dict) -> dict:
+    photos = client.table("photos").insert(params["p_photos"]).execute().data
+    events = client.table("timeline_events").insert(params["p_events"]).execute().data
+    return {"photos": photos, "events": events}
+
+
+_CALENDAR_DIFF_FIELDS = ("diary_id", "date", "title", "description", "start_time",
+                         "end_time", "location", "all_day", "source")
+
+
+@rpc_function("save_calendar_events")
+def _save_calendar_events(client: LocalClient, params: dict) -> dict:
+    events = params["p_events"]
+    keys = [e["calendar_id"] for e in events if e.get("calendar_id")]
+
+    day = client.table("calendar_events").select("id, calendar_id").eq("date", params["p_date"])
+    if params.get("p_diary_id"):
+        day = day.eq("diary_id", params["p_diary_id"])
+    stale = [r["id"] for r in day.execute().data if r["calendar_id"] not in keys]
+    if stale:
+        client.table("calendar_events").delete().in_("id", stale).execute()
+
+    stored = {}
+    if keys:
+        rows = client.table("calendar_events").select("*").in_("calendar_id", keys).execute().data
+        stored = {r["calendar_id"]: r for r in rows}
+
+    out, new, updated = [], [], 0
+    for e in events:
+        prev = stored.get(e.get("calendar_id"))
+        if prev is None:
+            new.append(e)
+            continue
+        changes = {k: e[k] for k in _CALENDAR_DIFF_FIELDS if k in e and e[k] != prev[k]}
+        if changes:
+            out += client.table("calendar_events").update(changes).eq("id", prev["id"]).execute().data
+            updated += 1
+        else:
+            out.append(prev)
+    if new:
+        out += client.table("calendar_events").insert(new).execute().data
+    return {"events": out, "inserted": len(new), "updated": updated, "deleted": len(stale)}
+
+
+@rpc_function("get_diary_history")
+def _get_diary_history(client: LocalClient, params: dict) -> list:
+    query = client.table("diaries").select("*")
+    if params.get("p_user_id"):
+        query = query.eq("user_id", params["p_user_id"])
+    if params.get("p_before"):
+        query = query.lt("date", params["p_before"])
+    diaries = query.order("date", desc=True).limit(params.get("p_limit", 30)).execute().data
+    ids = [d["id"] for d in diaries]
+
+    photos: dict[str, list] = {i: [] for i in ids}
+    for p in client.table("photos").select("diary_id, url, extracted_time").in_("diary_id", ids).execute().data:
+        photos[p["diary_id"]].append({"url": p["url"], "extracted_time": p["extracted_time"]})
+    covers = {
+        i: min(ps, key=lambda p: p["extracted_time"] or "00:00")["url"] if ps else None
+        for i, ps in photos.items()
+    }
+    if params.get("p_summary"):
+        return [
+            {
+                "id": d["id"],
+                "date": d["date"],
+                "diary_preview": d["diary_preview"],
+                "primary_emoji": d["primary_emoji"],
+                "total_spending": d["total_spending"],
+                "event_count": d["event_count"],
+                "photo_url": covers[d["id"]],
+            }
+            for d in diaries
+        ]
+
+    events: dict[str, list] = {i: [] for i in ids}
+    rows = (
+        client.table("timeline_events")
+        .select("id, diary_id, time, emoji, title, spending, source, is_deleted")
+        .in_("diary_id", ids)
+        .eq("is_deleted", False)
+        .execute().data
+    )
+    for e in rows:
+        events[e.pop("diary_id")].append(e)
+    return [
+        {**d, "photo_url": covers[d["id"]], "timeline_events": events[d["id"]], "photos": photos[d["id"]]}
+        for d in diaries
+    ]
+
+
+@rpc_function("get_or_create_diaries")
+def _get_or_create_diaries(client: LocalClient, params: dict) -> list:
+    user_id, dates = params["p_user_id"], list(dict.fromkeys(params["p_dates"]))
+    created = client.table("diaries").upsert(
+        [{"user_id": user_id, "date": d} for d in dates], on_conflict="user_id,date", ignore_duplicates=True,
+    ).execute().data
+    created_ids = {r["id"] for r in created}
+    rows = client.table("diaries").select("*").eq("user_id", user_id).in_("date", dates).order("date").execute().data
+    return [{**r, "created": r["id"] in created_ids} for r in rows]
+
+
+@rpc_function("save_diary_graph")
+def _save_diary_graph(client: LocalClient, params: dict) -> dict:
+    diary = client.table("diaries").upsert(params["p_diary"], on_conflict="user_id,date").execute().data[0]
+    events = [{**e, "diary_id": diary["id"]} for e in params["p_events"]]
+    keys = [e["event_key"] for e in events if e.get("event_key")]
+    existing = {}
+    if keys:
+        rows = (
+            client.table("timeline_events").select("id, event_key")
+            .eq("diary_id", diary["id"]).in_("event_key", keys).execute().data
+        )
+        existing = {r["event_key"]: r["id"] for r in rows}
+
+    # Adopt unkeyed rows from other write paths by (source, time, title)
+    unkeyed: dict[tuple, list[str]] = {}
+    rows = (
+        client.table("timeline_events").select("id, source, time, title")
+        .eq("diary_id", diary["id"]).is_("event_key", "null").order("created_at").execute().data
+    )
+    for r in rows:
+        unkeyed.setdefault((r["source"] or "generated", r["time"], r["title"]), []).append(r["id"])
+    for e in sorted(events, key=lambda e: e.get("event_key") or ""):
+        if e.get("event_key") in existing:
+            continue
+        ids = unkeyed.get((e.get("source") or "generated", e.get("time"), e.get("title")))
+        if ids:
+            event_id = ids.pop(0)
+            client.table("timeline_events").update({"event_key": e["event_key"]}).eq("id", event_id).execute()
+            existing[e["event_key"]] = event_id
+
+    saved, new = [], []
+    for e in events:
+        event_id = existing.get(e.get("event_key"))
+        if event_id is None:
+            new.append({"spending": 0, "is_deleted": False, **e})
+            continue
+        changes = {k: v for k, v in e.items() if v is not None and k not in ("is_deleted", "diary_id")}
+        saved += client.table("timeline_events").update(changes).eq("id", event_id).execute().data
+    if new:
+        saved += client.table("timeline_events").insert(new).execute().data
+    diary = client.table("diaries").select("*").eq("id", diary["id"]).execute().data[0]
+    return {**diary, "timeline_events": sorted(saved, key=lambda e: e["time"] or "")}
+
+
+_ANALYTICS_EVENTS = """
+    select d.date as date, e.spending as spending,
+           coalesce(e.category, 'uncategorized') as category,
+           coalesce(e.source, 'generated') as source
+    from diaries d
+    join timeline_events e on e.diary_id = d.id and not e.is_deleted
+    where d.user_id = ? and d.date between ? and ?
+"""
+
+
+@rpc_function("get_spending_analytics")
+def _get_spending_analytics(client: LocalClient, params: dict) -> dict:
+    args = [params["p_user_id"], params["p_start"], params["p_end"]]
+    window = int(params.get("p_window", 7))
+    days = """
+        with recursive series(date) as (
+          select date(?) union all select date(date, '+1 day') from series where date < date(?)
+        ),
+        per_day as (
+          select date, total_spending as total, event_count as events
+          from diaries where user_id = ? and date between ? and ?
+        ),
+        days as (
+          select s.date, coalesce(p.total, 0) as total, coalesce(p.events, 0) as events
+          from series s left join per_day p on p.date = s.date
+        )
+    """
+    day_args = [params["p_start"], params["p_end"], *args]
+    daily = client._run_sql(days + f"""
+        select date, total, events,
+               round(avg(total) over (order by date rows between {window - 1} preceding and current row), 2)
+                 as rolling_avg
+        from days order by date
+    """, day_args)
+    weekly = client._run_sql(days + """
+        select date(date, 'weekday 0', '-6 days') as week_start, sum(total) as total
+        from days group by 1 order by 1
+    """, day_args)
+    monthly = client._run_sql(days + """
+        select strftime('%Y-%m', date) as month, sum(total) as total
+        from days group by 1 order by 1
+    """, day_args)
+
+    def breakdown(column: str) -> list:
+        rows = client._run_sql(f"""
+            select {column}, sum(spending) as total, count(*) as events
+            from ({_ANALYTICS_EVENTS}) group by 1 order by total desc, 1
+        """, args)
+        return [dict(r) for r in rows]
+
+    total = sum(r["total"] for r in daily)
+    return {
+        "start": params["p_start"],
+        "end": params["p_end"],
+        "window": window,
+        "total": total,
+        "events": sum(r["events"] for r in daily),
+        "daily_avg": round(total / len(daily), 2) if daily else 0,
+        "daily": [dict(r) for r in daily],
+        "weekly": [dict(r) for r in weekly],
+        "monthly": [dict(r) for r in monthly],
+        "by_category": breakdown("category"),
+        "by_source": breakdown("source"),
+    }
+
+
+@rpc_function("save_calendar_range")
+def _save_calendar_range(client: LocalClient, params: dict) -> dict:
+    counts = {}
+    for day in params["p_days"]:
+        diary_id = day["diary_id"]
+        saved = _save_calendar_events(
+            client, {"p_date": day["date"], "p_diary_id": diary_id, "p_events": day["events"]},
+        )
+        shown = {
+            r["source_id"] for r in client.table("timeline_events").select("source_id")
+            .eq("diary_id", diary_id).eq("source", "calendar").eq("is_deleted", False).execute().data
+        }
+        new = [
+            {**t, "diary_id": diary_id} for t in day["timeline"]
+            if not t.get("source_id") or t["source_id"] not in shown
+        ]
+        if new:
+            client.table("timeline_events").insert(new).execute()
+        counts[day["date"]] = {"saved": len(saved["events"]), "timeline_inserted": len(new)}
+    return counts
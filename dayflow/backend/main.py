@@ -1,37 +1,60 @@
 import asyncio
 import base64
-import io
+import hashlib
 import json
 import logging
 import os
+from contextlib import asynccontextmanager
+from typing import Literal
 from uuid import UUID
 
-from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, UploadFile
+from fastapi import Depends, FastAPI, File, HTTPException, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, RedirectResponse
-from pydantic import BaseModel, field_validator
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError, field_validator
 from dedalus_labs import AsyncDedalus, DedalusRunner
 from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build as google_build
 from google.oauth2.credentials import Credentials
-
+from googleapiclient.errors import HttpError
+
+from batching import MicroBatcher
+from cache import LRUCache, TieredCache
+from exif_reader import extract_exif_batch
+from google_calendar import CredentialCache, list_events, run_blocking
+from images import preprocess_image, shutdown_pool as shutdown_image_pool
+from loaders import request_scope
+from responses import CompressionMiddleware, FastJSONResponse, encode_body, ndjson_stream, negotiate_encoding
 from db import (
     test_connection,
     get_or_create_diary,
-    save_diary as db_save_diary,
-    save_timeline_events,
+    get_or_create_diaries as db_get_or_create_diaries,
+    get_diary as db_get_diary,
+    save_diary_graph as db_save_diary_graph,
+    upsert_diaries as db_upsert_diaries,
+    upsert_timeline_events as db_upsert_timeline_events,
+    import_timeline_rows,
     get_active_timeline,
     add_manual_event,
     soft_delete_event,
     update_spending,
     save_thumb as db_save_thumb,
     get_diary_by_id as db_get_diary_by_id,
+    get_diary_owner as db_get_diary_owner,
+    user_version as db_user_version,
     get_diary_history as db_get_diary_history,
+    get_spending_analytics as db_get_spending_analytics,
+    iter_diary_archive as db_iter_diary_archive,
     save_calendar_events as db_save_calendar_events,
+    save_calendar_range as db_save_calendar_range,
     save_calendar_as_timeline,
     get_calendar_events as db_get_calendar_events,
     delete_calendar_events as db_delete_calendar_events,
-    save_photo_event as db_save_photo_event,
+    get_calendar_sync_token as db_get_calendar_sync_token,
+    save_calendar_sync_token as db_save_calendar_sync_token,
+    get_diary_ids_by_date as db_get_diary_ids_by_date,
+    has_calendar_timeline as db_has_calendar_timeline,
+    apply_calendar_delta as db_apply_calendar_delta,
+    save_photo_events as db_save_photo_events,
     save_photos as db_save_photos,
     get_photos as db_get_photos,
     upload_photo_to_storage,
@@ -44,7 +67,19 @@ from db import (
 
 logger = logging.getLogger("dayflow")
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background workers for the lifetime of the app."""
+    refresher = asyncio.create_task(credential_cache.run_refresher(GOOGLE_REFRESH_INTERVAL))
+    try:
+        yield
+    finally:
+        refresher.cancel()
+        shutdown_image_pool()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -57,7 +92,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
+app.add_middleware(CompressionMiddleware)
+
+
+@app.middleware("http")
+async def request_scope_middleware(request: Request, call_next):
+    """Give each request its own identity map for diary/user lookups."""
+    with request_scope():
+        return await call_next(request)
 
 
 # ── Global exception handler ─────────────────────────────────────
@@ -97,12 +141,58 @@ async def get_current_user(request: Request) -> str:
     return user_id
 
 
-async def _verify_diary_owner(diary_id: str, user_id: str) -> dict:
-    """Verify that a diary belongs to the given user. Returns diary or raises 404."""
-    diary = await db_get_diary_by_id(diary_id, user_id=user_id)
-    if not diary:
+async def _verify_diary_owner(diary_id: str, user_id: str) -> None:
+    """Verify that a diary belongs to the given user, or raise 404."""
+    if await db_get_diary_owner(diary_id) != user_id:
         raise HTTPException(status_code=404, detail="Diary not found")
-    return diary
+
+
+# ── Conditional GET cache ───────────────────────────────────────────
+# Read endpoints keep their last rendered body per user and URL, tagged with
+# the user's data version (db.user_version). While the version is unchanged
+# the cached body, or a 304 for a matching If-None-Match, is served without
+# touching the DB. Every write in db.py bumps the version.
+# The ETag is weak (W/) because gzip, br and identity share it; each
+# compressed variant is stored with the entry the first time it is served.
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "5000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Entries are (version, etag, body, headers, {coding: encoded body}); bounded
+# by total bytes too
+response_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE, maxweight=RESPONSE_CACHE_MAX_BYTES,
+                          weigh=lambda hit: len(hit[2]) + sum(map(len, hit[4].values())))
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    return etag.removeprefix("W/") in tags or "*" in tags
+
+
+async def _cached_get(request: Request, user_id: str, build) -> Response:
+    """Serve the FastJSONResponse from ``build()`` through the per-user ETag cache."""
+    key = (user_id, request.url.path, request.url.query)
+    version = db_user_version(user_id)
+    hit = response_cache.get(key)
+    if hit is None or hit[0] != version:
+        resp = await build()
+        etag = 'W/"' + hashlib.sha256(resp.body).hexdigest()[:32] + '"'
+        extra = {k: v for k, v in resp.headers.items() if k.lower().startswith("x-")}
+        hit = (version, etag, resp.body, extra, {})
+        response_cache.set(key, hit)
+    _, etag, body, extra, encoded = hit
+    headers = {**extra, "ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    coding = negotiate_encoding(request.scope, len(body))
+    if coding is None:
+        return Response(body, media_type="application/json", headers=headers)
+    if coding not in encoded:
+        encoded = {**encoded, coding: await asyncio.to_thread(encode_body, body, coding)}
+        response_cache.set(key, (version, etag, body, extra, encoded))
+    return Response(encoded[coding], media_type="application/json",
+                    headers={**headers, "Content-Encoding": coding})
 
 
 # ── Dedalus client ──────────────────────────────────────────────────
@@ -156,25 +246,19 @@ def _get_google_flow() -> Flow:
     )
 
 
+GOOGLE_REFRESH_INTERVAL = float(os.getenv("GOOGLE_REFRESH_INTERVAL", "60"))
+
+credential_cache = CredentialCache(db_get_google_token, db_save_google_token, GOOGLE_SCOPES)
+
+
 async def _load_user_credentials(user_id: str) -> Credentials | None:
-    """Load Google OAuth credentials from DB for a user."""
-    token_data = await db_get_google_token(user_id)
-    if not token_data:
-        return None
-    try:
-        creds = Credentials.from_authorized_user_info(token_data, GOOGLE_SCOPES)
-        if creds and creds.expired and creds.refresh_token:
-            from google.auth.transport.requests import Request
-            creds.refresh(Request())
-            await db_save_google_token(user_id, json.loads(creds.to_json()))
-        return creds
-    except Exception:
-        return None
+    """Load Google OAuth credentials for a user (cached, refreshed if expired)."""
+    return await credential_cache.get(user_id)
 
 
 async def _save_user_credentials(user_id: str, creds: Credentials) -> None:
     """Persist Google OAuth credentials to DB for a user."""
-    await db_save_google_token(user_id, json.loads(creds.to_json()))
+    await credential_cache.put(user_id, creds)
 
 
 # ── Request models ──────────────────────────────────────────────────
@@ -187,6 +271,7 @@ class TimelineEvent(BaseModel):
     spending: float = 0
     category: str | None = None
     source: str | None = None
+    event_key: str | None = None  # stable id for idempotent saves; derived if omitted
 
 
 class DiaryOutput(BaseModel):
@@ -206,6 +291,17 @@ class SaveDiaryRequest(BaseModel):
     date: str
 
 
+class ImportDiaryLine(SaveDiaryRequest):
+    """One /api/diary/import line; a bad date fails only its own line."""
+
+    @field_validator("date")
+    @classmethod
+    def validate_date(cls, v: str) -> str:
+        from datetime import date as date_cls
+
+        return date_cls.fromisoformat(v).isoformat()
+
+
 class UpdateSpendingRequest(BaseModel):
     event_id: str
 
@@ -320,7 +416,7 @@ async def google_auth_callback(code: str = Query(...), state: str = Query(defaul
     try:
         flow = _get_google_flow()
         logger.info("Google OAuth callback: exchanging code for token (user_id=%s)", state)
-        flow.fetch_token(code=code)
+        await run_blocking(flow.fetch_token, code=code)
         creds = flow.credentials
         logger.info("Google OAuth: token exchange successful")
 
@@ -360,14 +456,19 @@ async def update_timeline_spending(
 
 @app.get("/api/timeline")
 async def get_timeline(
+    request: Request,
     diary_id: str = Query(...),
     user_id: str = Depends(get_current_user),
 ):
     """Get active (non-deleted) timeline events for a diary, sorted by time."""
     _validate_uuid(diary_id, "diary_id")
-    await _verify_diary_owner(diary_id, user_id)
-    events = await get_active_timeline(diary_id)
-    return {"timeline": events}
+
+    async def build():
+        await _verify_diary_owner(diary_id, user_id)
+        events = await get_active_timeline(diary_id)
+        return FastJSONResponse({"timeline": events})
+
+    return await _cached_get(request, user_id, build)
 
 
 @app.post("/api/timeline/add")
@@ -407,22 +508,19 @@ async def save_diary(
     body: SaveDiaryRequest,
     user_id: str = Depends(get_current_user),
 ):
-    """Save a complete diary + timeline events to Supabase."""
-    diary_fields = body.diary.model_dump(exclude={"timeline"})
-    if "total_spending" in diary_fields:
-        diary_fields["total_spending"] = round(diary_fields["total_spending"])
+    """Save a complete diary + timeline events to Supabase (idempotent)."""
+    # Only fields the client sent, so the RPC leaves the rest untouched;
+    # total_spending is derived from the timeline in the database
+    diary_fields = body.diary.model_dump(exclude_unset=True, exclude={"timeline", "total_spending"})
     diary_fields["user_id"] = user_id
-    diary_row = await db_save_diary(body.date, diary_fields)
 
-    events = []
-    if body.diary.timeline:
-        event_dicts = [e.model_dump() for e in body.diary.timeline]
-        for ed in event_dicts:
-            if "spending" in ed:
-                ed["spending"] = round(ed["spending"])
-        events = await save_timeline_events(diary_row["id"], event_dicts)
+    event_dicts = [e.model_dump() for e in body.diary.timeline]
+    for ed in event_dicts:
+        if "spending" in ed:
+            ed["spending"] = round(ed["spending"])
 
-    return {**diary_row, "timeline_events": events}
+    # Diary + timeline in one transaction; events merge by key so retries don't duplicate
+    return await db_save_diary_graph(body.date, diary_fields, event_dicts)
 
 
 @app.post("/api/diary/thumb")
@@ -438,11 +536,208 @@ async def thumb(
 
 @app.get("/api/diary/history")
 async def diary_history(
+    request: Request,
     limit: int = Query(default=30, ge=1, le=100),
+    before: str | None = Query(default=None, description="Cursor: only diaries dated before this YYYY-MM-DD"),
+    view: Literal["full", "summary"] = Query(default="full", description="'summary' returns card fields only"),
+    user_id: str = Depends(get_current_user),
+):
+    """Return past diaries ordered by date desc, with timeline events.
+
+    Pages by date: when a full page is returned, the X-Next-Cursor header holds
+    the value to pass as ``before`` for the next page.
+    """
+    if before is not None:
+        from datetime import date as date_cls
+
+        try:
+            before = date_cls.fromisoformat(before).isoformat()
+        except ValueError:
+            raise HTTPException(status_code=400, detail="before must be YYYY-MM-DD")
+
+    async def build():
+        diaries = await db_get_diary_history(limit, user_id=user_id, before=before, summary=view == "summary")
+        headers = {"X-Next-Cursor": diaries[-1]["date"]} if len(diaries) == limit else None
+        return FastJSONResponse(diaries, headers=headers)
+
+    return await _cached_get(request, user_id, build)
+
+
+ANALYTICS_MAX_DAYS = int(os.getenv("ANALYTICS_MAX_DAYS", "3660"))
+
+
+@app.get("/api/analytics/spending")
+async def spending_analytics(
+    request: Request,
+    start: str | None = Query(default=None, description="First date (YYYY-MM-DD), inclusive; default end - 29 days"),
+    end: str | None = Query(default=None, description="Last date (YYYY-MM-DD), inclusive; default today"),
+    window: int = Query(default=7, ge=1, le=365, description="Rolling average window in days"),
+    user_id: str = Depends(get_current_user),
+):
+    """Daily/weekly/monthly spending totals, breakdowns and rolling averages.
+
+    Aggregated in the database, so a multi-year range costs one small response.
+    """
+    from datetime import date as date_cls, timedelta
+
+    try:
+        last = date_cls.fromisoformat(end) if end else date_cls.today()
+        first = date_cls.fromisoformat(start) if start else last - timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+    if last < first:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (last - first).days + 1 > ANALYTICS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Maximum {ANALYTICS_MAX_DAYS} days per report")
+
+    async def build():
+        report = await db_get_spending_analytics(user_id, first.isoformat(), last.isoformat(), window)
+        return FastJSONResponse(report)
+
+    if end is None:
+        return await build()  # "today" moves, so a defaulted range is not cacheable by URL
+    return await _cached_get(request, user_id, build)
+
+
+IMPORT_CHUNK_LINES = int(os.getenv("IMPORT_CHUNK_LINES", "500"))
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "1000"))
+IMPORT_MAX_IN_FLIGHT = int(os.getenv("IMPORT_MAX_IN_FLIGHT", "4"))
+
+_import_line = TypeAdapter(ImportDiaryLine)
+
+
+async def _ndjson_lines(request: Request):
+    """Yield (line_number, raw_line) from a streamed NDJSON body, skipping blanks."""
+    buf = b""
+    n = 0
+    async for chunk in request.stream():
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            n += 1
+            if line.strip():
+                yield n, line
+    if buf.strip():
+        yield n + 1, buf
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(map(str, err['loc']))}: {err['msg']}" if err["loc"] else err["msg"]
+        for err in e.errors()
+    )
+
+
+@app.post("/api/diary/import")
+async def import_diaries(
+    request: Request,
     user_id: str = Depends(get_current_user),
 ):
-    """Return past diaries ordered by date desc, with timeline events."""
-    return await db_get_diary_history(limit, user_id=user_id)
+    """Bulk-import diaries from an NDJSON body, one {"date", "diary"} object per line.
+
+    Lines are validated in chunks; each chunk's diaries are upserted in one
+    call and their timeline rows written in batches, with at most
+    IMPORT_MAX_IN_FLIGHT writes outstanding (reading pauses until one
+    finishes). Re-importing is idempotent: events merge by event_key, and a
+    later line for the same date wins. Returns a per-line error report.
+    """
+    errors: list[dict] = []
+    imported = 0
+    total_lines = 0
+    slots = asyncio.Semaphore(IMPORT_MAX_IN_FLIGHT)
+    event_writes: list[asyncio.Task] = []
+
+    async def _write(lines: list[int], fn, *args):
+        try:
+            return await fn(*args)
+        except Exception as e:
+            errors.extend({"line": n, "error": f"write failed: {e}"} for n in lines)
+            return None
+        finally:
+            slots.release()
+
+    async def _submit(lines: list[int], fn, *args) -> asyncio.Task:
+        await slots.acquire()  # backpressure
+        return asyncio.create_task(_write(lines, fn, *args))
+
+    async def _flush(chunk: list[tuple[int, bytes]]) -> None:
+        nonlocal imported
+        by_date: dict[str, tuple[int, ImportDiaryLine]] = {}
+        for n, raw in chunk:
+            try:
+                item = _import_line.validate_json(raw)
+            except ValidationError as e:
+                errors.append({"line": n, "error": _validation_message(e)})
+                continue
+            by_date[item.date] = (n, item)
+        if not by_date:
+            return
+
+        diaries = [
+            {"date": date, **item.diary.model_dump(exclude_unset=True, exclude={"timeline"})}
+            for date, (_, item) in by_date.items()
+        ]
+        diary_lines = [n for n, _ in by_date.values()]
+        ids = await (await _submit(diary_lines, db_upsert_diaries, user_id, diaries))
+        if not ids:
+            return
+        imported += len(ids)
+
+        rows, row_lines = [], []
+        for date, (n, item) in by_date.items():
+            events = [e.model_dump() for e in item.diary.timeline]
+            for row in import_timeline_rows(ids[date], events):
+                rows.append(row)
+                row_lines.append(n)
+        for i in range(0, len(rows), IMPORT_BATCH_ROWS):
+            lines = sorted(set(row_lines[i:i + IMPORT_BATCH_ROWS]))
+            event_writes.append(
+                await _submit(lines, db_upsert_timeline_events, rows[i:i + IMPORT_BATCH_ROWS])
+            )
+
+    chunk: list[tuple[int, bytes]] = []
+    async for n, raw in _ndjson_lines(request):
+        total_lines = n
+        chunk.append((n, raw))
+        if len(chunk) >= IMPORT_CHUNK_LINES:
+            await _flush(chunk)
+            chunk = []
+    await _flush(chunk)
+
+    written = await asyncio.gather(*event_writes)
+    return {
+        "lines": total_lines,
+        "imported": imported,
+        "events": sum(w or 0 for w in written),
+        "errors": sorted(errors, key=lambda e: e["line"]),
+    }
+
+
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "50"))
+
+
+@app.get("/api/diary/export")
+async def export_diaries(
+    gzip: bool = Query(default=False, description="Download as .ndjson.gz"),
+    user_id: str = Depends(get_current_user),
+):
+    """Stream all of the user's diaries as NDJSON, one diary per line.
+
+    Each line holds the diary with its active timeline, photos and calendar
+    events. Memory use is bounded by EXPORT_PAGE_SIZE, not archive size.
+    """
+    lines = ndjson_stream(db_iter_diary_archive(user_id, EXPORT_PAGE_SIZE), gzip=gzip)
+    if gzip:
+        return StreamingResponse(
+            lines,
+            media_type="application/gzip",
+            headers={"Content-Disposition": 'attachment; filename="dayflow-export.ndjson.gz"'},
+        )
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": 'attachment; filename="dayflow-export.ndjson"'},
+    )
 
 
 @app.get("/api/diary/draft")
@@ -457,15 +752,20 @@ async def get_or_create_draft(
 
 @app.get("/api/diary/{diary_id}")
 async def get_diary_detail(
+    request: Request,
     diary_id: str,
     user_id: str = Depends(get_current_user),
 ):
     """Get a single diary with full timeline events and photos."""
     _validate_uuid(diary_id, "diary_id")
-    diary = await db_get_diary_by_id(diary_id, user_id=user_id)
-    if not diary:
-        raise HTTPException(status_code=404, detail="Diary not found")
-    return diary
+
+    async def build():
+        diary = await db_get_diary_by_id(diary_id, user_id=user_id)
+        if not diary:
+            raise HTTPException(status_code=404, detail="Diary not found")
+        return FastJSONResponse(diary)
+
+    return await _cached_get(request, user_id, build)
 
 
 @app.delete("/api/diary/{diary_id}")
@@ -500,10 +800,7 @@ async def get_photos_endpoint(
 ):
     """Get all photos for a diary entry."""
     _validate_uuid(diary_id, "diary_id")
-    # Verify diary belongs to current user
-    diary = await db_get_diary_by_id(diary_id, user_id=user_id)
-    if not diary:
-        raise HTTPException(status_code=404, detail="Diary not found")
+    await _verify_diary_owner(diary_id, user_id)
     photos = await db_get_photos(diary_id)
     return {"photos": photos}
 
@@ -544,59 +841,178 @@ async def save_calendar(
     }
 
 
+def _google_event_to_dict(ge: dict) -> dict:
+    """Convert a Google Calendar API event to our CalendarEvent format."""
+    start = ge.get("start", {})
+    end = ge.get("end", {})
+    return {
+        "title": ge.get("summary", "Untitled"),
+        "description": ge.get("description"),
+        "start_time": start.get("dateTime", start.get("date", "")),
+        "end_time": end.get("dateTime", end.get("date", "")),
+        "location": ge.get("location"),
+        "all_day": "date" in start and "dateTime" not in start,
+        "calendar_id": ge.get("id"),
+    }
+
+
+def _event_local_date(event: dict, zone) -> str:
+    """YYYY-MM-DD the event starts on in ``zone`` (all-day events keep their date)."""
+    start = event.get("start_time", "")
+    if event.get("all_day") or "T" not in start:
+        return start[:10]
+    from datetime import datetime
+    return datetime.fromisoformat(start.replace("Z", "+00:00")).astimezone(zone).date().isoformat()
+
+
+async def _list_events_or_primary(creds, cal_id: str, **params) -> dict:
+    """list_events, falling back to 'primary' when the calendar ID is unusable."""
+    try:
+        return await list_events(creds, cal_id, **params)
+    except HttpError as e:
+        if e.resp.status in (401, 410) or cal_id == "primary":
+            raise
+    except Exception:
+        if cal_id == "primary":
+            raise
+    logger.warning("Calendar ID '%s' not found, falling back to 'primary'", cal_id)
+    return await list_events(creds, "primary", **params)
+
+
+async def _list_calendar_events(user_id: str, creds, cal_id: str, **params) -> dict:
+    """List events; on a 401 refresh through credential_cache and retry once."""
+    token = creds.token
+    try:
+        return await _list_events_or_primary(creds, cal_id, **params)
+    except HttpError as e:
+        if e.resp.status != 401:
+            raise
+    creds = await credential_cache.reauthorize(user_id, creds, token)
+    if creds is None:
+        raise HTTPException(status_code=401, detail="Google Calendar authorization expired. Visit /api/auth/google again.")
+    return await _list_events_or_primary(creds, cal_id, **params)
+
+
+async def _sync_calendar_incremental(user_id: str, creds, cal_id: str, date: str, zone, day_params: dict) -> dict:
+    """Pull only what changed since the stored sync token and apply it to the DB.
+
+    Without a token (or when Google expires it with 410) this does one full
+    listing and stores the new token. Changes are applied to days the user
+    already has a diary for, plus the requested day. A requested day with no
+    calendar rows yet (its diary appeared after the token was stored, or it
+    was just created) is backfilled with a one-day listing.
+    """
+    token = await db_get_calendar_sync_token(user_id, cal_id)
+    try:
+        result = await _list_calendar_events(user_id, creds, cal_id, singleEvents=True, syncToken=token) if token \
+            else await _list_calendar_events(user_id, creds, cal_id, singleEvents=True)
+    except HttpError as e:
+        if not token or e.resp.status != 410:
+            raise
+        logger.info("Sync token expired for calendar '%s', running a full sync", cal_id)
+        await db_save_calendar_sync_token(user_id, cal_id, None)
+        token = None
+        result = await _list_calendar_events(user_id, creds, cal_id, singleEvents=True)
+
+    changed: dict[str, dict] = {}
+    cancelled: list[str] = []
+    for ge in result.get("items", []):
+        if ge.get("status") == "cancelled":
+            cancelled.append(ge["id"])
+            continue
+        event = _google_event_to_dict(ge)
+        event["date"] = _event_local_date(event, zone)
+        changed[event["calendar_id"]] = event
+
+    diary_ids = await db_get_diary_ids_by_date(user_id, sorted({e["date"] for e in changed.values()} | {date}))
+    if date not in diary_ids:
+        diary = await get_or_create_diary(date, user_id=user_id)
+        diary_ids[date] = diary["id"]
+    if token and not await db_has_calendar_timeline(diary_ids[date]):
+        # Deltas since the token skip unchanged events: pull this day in full
+        day = await _list_calendar_events(user_id, creds, cal_id, **day_params)
+        for ge in day.get("items", []):
+            event = _google_event_to_dict(ge)
+            event["date"] = _event_local_date(event, zone)
+            changed.setdefault(event["calendar_id"], event)
+
+    relevant = [e for e in changed.values() if e["date"] in diary_ids]
+    emojis = await _assign_emojis(relevant)
+    for i, e in enumerate(relevant):
+        e["emoji"] = emojis[i] if i < len(emojis) else "\U0001f4c5"
+
+    applied = await db_apply_calendar_delta(user_id, diary_ids, relevant, cancelled)
+    # An empty delta leaves the stored token valid; skip the write
+    next_token = result.get("nextSyncToken")
+    if next_token and next_token != token and (not token or result.get("items")):
+        await db_save_calendar_sync_token(user_id, cal_id, next_token)
+
+    timeline = await get_active_timeline(diary_ids[date])
+    frontend_events = [
+        {
+            "time": ev.get("time", ""),
+            "title": ev.get("title", ""),
+            "location": ev.get("location") or "",
+            "emoji": ev.get("emoji", "\U0001f4c5"),
+            "description": ev.get("description") or "",
+            "calendar_id": ev.get("source_id", ""),
+        }
+        for ev in timeline if ev.get("source") == "calendar"
+    ]
+    return {
+        "date": date,
+        "events": frontend_events,
+        "diary_id": diary_ids[date],
+        "changed": applied["changed"],
+        "cancelled": applied["cancelled"],
+        "full_sync": not token,
+    }
+
+
 @app.get("/api/calendar/fetch")
 async def fetch_calendar(
     date: str = Query(..., description="Date in YYYY-MM-DD format"),
     calendar_id: str = Query(default="", description="Google Calendar ID"),
     tz: str = Query(default="America/New_York", description="Timezone"),
+    incremental: bool = Query(default=False, description="Sync changes via Google sync tokens"),
     user_id: str = Depends(get_current_user),
 ):
     """Fetch Google Calendar events for a date via Google Calendar API,
-    save to DB, and return them with emojis."""
+    save to DB, and return them with emojis.
+
+    With ``incremental=true`` only events changed since the last sync are
+    pulled (using Google's nextSyncToken) and applied to the stored diaries.
+    """
     creds = await _load_user_credentials(user_id)
 
     if not creds:
         raise HTTPException(status_code=401, detail="Google Calendar not connected. Visit /api/auth/google first.")
 
-    # Refresh token if expired
-    if creds.expired and creds.refresh_token:
-        from google.auth.transport.requests import Request as GoogleRequest
-        creds.refresh(GoogleRequest())
-        await _save_user_credentials(user_id, creds)
-
     # Extract calendar ID from URL if needed
     cal_id_raw = calendar_id or DEFAULT_CALENDAR_ID
     cal_id = _extract_calendar_id(cal_id_raw)
 
-    # Fetch events from Google Calendar API
-    service = google_build("calendar", "v3", credentials=creds)
+    from datetime import date as date_cls, datetime, timedelta
+    from zoneinfo import ZoneInfo
+
+    zone = ZoneInfo(tz)
+    d = date_cls.fromisoformat(date)
+    day_start = datetime(d.year, d.month, d.day, tzinfo=zone)
+    day_end = day_start + timedelta(days=1)
+    day_params = {
+        "timeMin": day_start.isoformat(),
+        "timeMax": day_end.isoformat(),
+        "singleEvents": True,
+        "orderBy": "startTime",
+    }
 
+    # Fetch events from Google Calendar API (cached client, off the event loop)
     try:
-        from datetime import date as date_cls, datetime, timedelta
-        from zoneinfo import ZoneInfo
-
-        zone = ZoneInfo(tz)
-        d = date_cls.fromisoformat(date)
-        day_start = datetime(d.year, d.month, d.day, tzinfo=zone)
-        day_end = day_start + timedelta(days=1)
-
-        def _fetch_events(cid: str):
-            return service.events().list(
-                calendarId=cid,
-                timeMin=day_start.isoformat(),
-                timeMax=day_end.isoformat(),
-                singleEvents=True,
-                orderBy="startTime",
-            ).execute()
-
-        try:
-            result = _fetch_events(cal_id)
-        except Exception:
-            if cal_id != "primary":
-                logger.warning("Calendar ID '%s' not found, falling back to 'primary'", cal_id)
-                result = _fetch_events("primary")
-            else:
-                raise
+        if incremental:
+            return await _sync_calendar_incremental(user_id, creds, cal_id, date, zone, day_params)
+        result = await _list_calendar_events(user_id, creds, cal_id, **day_params)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=502, detail=f"Google Calendar API error: {str(e)}")
 
@@ -606,27 +1022,10 @@ async def fetch_calendar(
         return {"date": date, "events": [], "diary_id": None, "saved": 0}
 
     # Convert Google events to our CalendarEvent format
-    event_dicts = []
-    for ge in google_events:
-        start = ge.get("start", {})
-        end = ge.get("end", {})
-        start_time = start.get("dateTime", start.get("date", ""))
-        end_time = end.get("dateTime", end.get("date", ""))
-        all_day = "date" in start and "dateTime" not in start
-
-        event_date = start_time[:10]
-        if event_date != date:
-            continue
-
-        event_dicts.append({
-            "title": ge.get("summary", "Untitled"),
-            "description": ge.get("description"),
-            "start_time": start_time,
-            "end_time": end_time,
-            "location": ge.get("location"),
-            "all_day": all_day,
-            "calendar_id": ge.get("id"),
-        })
+    event_dicts = [
+        e for e in map(_google_event_to_dict, google_events)
+        if e["start_time"][:10] == date
+    ]
 
     # Generate emojis via LLM
     emojis = await _assign_emojis(event_dicts)
@@ -663,6 +1062,99 @@ async def fetch_calendar(
     }
 
 
+CALENDAR_IMPORT_MAX_DAYS = int(os.getenv("CALENDAR_IMPORT_MAX_DAYS", "92"))
+
+
+@app.get("/api/calendar/import")
+async def import_calendar_range(
+    start: str = Query(..., description="First date (YYYY-MM-DD), inclusive"),
+    end: str = Query(..., description="Last date (YYYY-MM-DD), inclusive"),
+    calendar_id: str = Query(default="", description="Google Calendar ID"),
+    tz: str = Query(default="America/New_York", description="Timezone"),
+    user_id: str = Depends(get_current_user),
+):
+    """Import Google Calendar events for every day in [start, end] at once.
+
+    One paginated Google listing over the window, one emoji pass, and bulk
+    diary/calendar/timeline writes. Returns per-day counts.
+    """
+    creds = await _load_user_credentials(user_id)
+
+    if not creds:
+        raise HTTPException(status_code=401, detail="Google Calendar not connected. Visit /api/auth/google first.")
+
+    from datetime import date as date_cls, datetime, timedelta
+    from zoneinfo import ZoneInfo
+
+    try:
+        first, last = date_cls.fromisoformat(start), date_cls.fromisoformat(end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be YYYY-MM-DD")
+    if last < first:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (last - first).days + 1 > CALENDAR_IMPORT_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Maximum {CALENDAR_IMPORT_MAX_DAYS} days per import")
+
+    cal_id = _extract_calendar_id(calendar_id or DEFAULT_CALENDAR_ID)
+    zone = ZoneInfo(tz)
+    window_start = datetime(first.year, first.month, first.day, tzinfo=zone)
+    window_end = datetime(last.year, last.month, last.day, tzinfo=zone) + timedelta(days=1)
+
+    try:
+        result = await _list_calendar_events(
+            user_id,
+            creds,
+            cal_id,
+            timeMin=window_start.isoformat(),
+            timeMax=window_end.isoformat(),
+            singleEvents=True,
+            orderBy="startTime",
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Google Calendar API error: {str(e)}")
+
+    # Bucket by the local date each event starts on (compare normalized dates:
+    # fromisoformat also accepts forms like 20250302)
+    first_day, last_day = first.isoformat(), last.isoformat()
+    by_date: dict[str, list[dict]] = {}
+    for event in map(_google_event_to_dict, result.get("items", [])):
+        day = _event_local_date(event, zone)
+        if first_day <= day <= last_day:
+            by_date.setdefault(day, []).append(event)
+
+    all_events = [e for events in by_date.values() for e in events]
+    emojis = await _assign_emojis(all_events)
+    for i, e in enumerate(all_events):
+        e["emoji"] = emojis[i] if i < len(emojis) else "\U0001f4c5"
+
+    diary_ids = await db_get_or_create_diaries(sorted(by_date), user_id) if by_date else {}
+    # Days left with no events still get diffed (clearing events deleted in
+    # Google) when the user already has a diary for them
+    all_days = [(first + timedelta(days=i)).isoformat() for i in range((last - first).days + 1)]
+    empty_days = [d for d in all_days if d not in by_date]
+    for day, diary_id in (await db_get_diary_ids_by_date(user_id, empty_days)).items():
+        diary_ids[day] = diary_id
+        by_date[day] = []
+    counts = await db_save_calendar_range(by_date, diary_ids)
+
+    return {
+        "start": first_day,
+        "end": last_day,
+        "total": len(all_events),
+        "days": [
+            {
+                "date": day,
+                "diary_id": diary_ids[day],
+                "events": len(by_date[day]),
+                **counts[day],
+            }
+            for day in sorted(by_date)
+        ],
+    }
+
+
 @app.get("/api/calendar/events")
 async def get_calendar(
     date: str = Query(...),
@@ -702,12 +1194,20 @@ Example output: ["💻", "🍽️", "🏋️"]
 """
 
 
-async def _assign_emojis(events: list[dict]) -> list[str]:
-    """Call LLM to assign emojis to calendar events in one batch."""
-    titles = [e.get("title", "") for e in events]
-    if not titles:
-        return []
+EMOJI_FALLBACK = "\U0001f4c5"
+EMOJI_CACHE_SIZE = int(os.getenv("EMOJI_CACHE_SIZE", "10000"))
+
+# normalized title -> emoji; persisted to CACHE_DB_PATH when configured
+emoji_cache = TieredCache("emoji", maxsize=EMOJI_CACHE_SIZE)
+
+
+def _normalize_title(title: str) -> str:
+    """Cache key for a title: case- and whitespace-insensitive."""
+    return " ".join((title or "").lower().split())
 
+
+async def _llm_assign_emojis(titles: list[str]) -> list[str] | None:
+    """Ask the LLM for one emoji per title. Returns None on any failure."""
     prompt = EMOJI_PROMPT.replace("{events}", json.dumps(titles))
 
     try:
@@ -725,64 +1225,58 @@ async def _assign_emojis(events: list[dict]) -> list[str]:
     except Exception:
         pass
 
-    return ["\U0001f4c5"] * len(titles)
+    return None
 
 
-# ── EXIF extraction ──────────────────────────────────────────────────
+async def _emoji_batch_handler(titles: list[str]) -> list[str | None]:
+    """Resolve titles from many concurrent callers with a single LLM call."""
+    unique: dict[str, str] = {}
+    for t in titles:
+        unique.setdefault(_normalize_title(t), t)
+    emojis = await _llm_assign_emojis(list(unique.values()))
+    if emojis is None:
+        return [None] * len(titles)
+    by_key = dict(zip(unique, emojis))
+    return [by_key[_normalize_title(t)] for t in titles]
 
-def _extract_exif(raw: bytes) -> dict:
-    """Extract time and GPS from EXIF data. Returns dict with 'time' and/or 'gps'."""
-    result: dict = {}
-    try:
-        from PIL import Image
-        from PIL.ExifTags import TAGS, GPSTAGS
-
-        img = Image.open(io.BytesIO(raw))
-        exif_data = img._getexif()
-        if not exif_data:
-            return result
-
-        # Extract DateTimeOriginal or DateTimeDigitized
-        for tag_id, value in exif_data.items():
-            tag = TAGS.get(tag_id, tag_id)
-            if tag == "DateTimeOriginal" or tag == "DateTimeDigitized":
-                # Format: "2025:01:15 14:30:00"
-                if isinstance(value, str) and len(value) >= 16:
-                    time_part = value.split(" ")[1] if " " in value else None
-                    if time_part:
-                        result["time"] = time_part[:5]  # "14:30"
-                        result["datetime_original"] = value
-                break  # DateTimeOriginal is preferred, stop after first match
-
-        # Extract GPS coordinates
-        gps_info = exif_data.get(34853)  # GPSInfo tag
-        if gps_info:
-            def _to_degrees(ref, values):
-                d = float(values[0])
-                m = float(values[1])
-                s = float(values[2])
-                dd = d + m / 60 + s / 3600
-                if ref in ("S", "W"):
-                    dd = -dd
-                return round(dd, 6)
 
-            try:
-                lat_ref = gps_info.get(1, "N")
-                lat = gps_info.get(2)
-                lon_ref = gps_info.get(3, "E")
-                lon = gps_info.get(4)
-                if lat and lon:
-                    result["gps"] = {
-                        "lat": _to_degrees(lat_ref, lat),
-                        "lon": _to_degrees(lon_ref, lon),
-                    }
-            except (TypeError, IndexError, ZeroDivisionError):
-                pass
+EMOJI_BATCH_WINDOW_MS = float(os.getenv("EMOJI_BATCH_WINDOW_MS", "25"))
+EMOJI_BATCH_MAX = int(os.getenv("EMOJI_BATCH_MAX", "50"))
 
-    except Exception as e:
-        logger.debug("EXIF extraction failed for image: %s", e)
+emoji_batcher = MicroBatcher(
+    _emoji_batch_handler,
+    window=EMOJI_BATCH_WINDOW_MS / 1000,
+    max_batch=EMOJI_BATCH_MAX,
+)
 
-    return result
+
+async def _assign_emojis(events: list[dict]) -> list[str]:
+    """Assign emojis to calendar events, calling the LLM only for uncached titles.
+
+    Misses from concurrent requests are coalesced by emoji_batcher into one prompt.
+    """
+    titles = [e.get("title", "") for e in events]
+    if not titles:
+        return []
+
+    keys = [_normalize_title(t) for t in titles]
+    known = await emoji_cache.aget_many(list(dict.fromkeys(keys)))
+
+    # Distinct misses, keeping first-seen original casing for the prompt
+    misses: dict[str, str] = {}
+    for key, title in zip(keys, titles):
+        if key not in known and key not in misses:
+            misses[key] = title
+    if misses:
+        try:
+            emojis = await emoji_batcher.submit(list(misses.values()))
+        except Exception:
+            emojis = [None] * len(misses)
+        fresh = {k: e for k, e in zip(misses, emojis) if e}
+        await emoji_cache.aset_many(fresh)
+        known.update(fresh)
+
+    return [known.get(k, EMOJI_FALLBACK) for k in keys]
 
 
 @app.post("/api/emoji/assign")
@@ -825,44 +1319,68 @@ Return ONLY the JSON object, no markdown or extra text. Example:
 """
 
 
-async def _analyze_one(raw: bytes, mime: str, filename: str) -> dict:
-    """Extract EXIF metadata, then send image to Dedalus for vision analysis."""
-    exif = _extract_exif(raw)
+PHOTO_CACHE_SIZE = int(os.getenv("PHOTO_CACHE_SIZE", "2000"))
+PHOTO_CACHE_TTL_HOURS = float(os.getenv("PHOTO_CACHE_TTL_HOURS", "168"))
+
+# "<prompt variant>:<sha256 of image bytes>" -> parsed vision result
+photo_analysis_cache = TieredCache(
+    "photo_analysis",
+    maxsize=PHOTO_CACHE_SIZE,
+    ttl=PHOTO_CACHE_TTL_HOURS * 3600,
+)
+
+
+async def _analyze_one(raw: bytes, mime: str, filename: str, exif: dict | None = None) -> dict:
+    """Extract EXIF metadata, then send image to Dedalus for vision analysis.
+
+    Pass ``exif`` when it was already batch-extracted for the upload.
+    Results are cached by image content hash, so re-uploads skip the LLM.
+    """
+    if exif is None:
+        exif = (await extract_exif_batch([raw]))[0]
     exif_time = exif.get("time")  # e.g. "14:30" or None
     exif_gps = exif.get("gps")   # e.g. {"lat": 40.44, "lon": -79.99} or None
 
     # Use shorter prompt if EXIF already provides time
     prompt = PHOTO_ANALYSIS_PROMPT if exif_time else PHOTO_ANALYSIS_PROMPT_NO_EXIF
 
-    b64 = base64.b64encode(raw).decode()
-
-    result = await runner.run(
-        model="anthropic/claude-sonnet-4-5-20250929",
-        input=[
-            {"role": "user", "content": [
-                {"type": "text", "text": prompt},
-                {"type": "image_url", "image_url": {
-                    "url": f"data:{mime};base64,{b64}",
-                }},
-            ]},
-        ],
-        max_steps=1,
-    )
+    digest = await asyncio.to_thread(lambda: hashlib.sha256(raw).hexdigest())
+    cache_key = f"{'exif' if exif_time else 'no_exif'}:{digest}"
+    parsed = await photo_analysis_cache.aget(cache_key)
 
-    text = result.final_output or ""
-    text = text.strip()
-    if text.startswith("```"):
-        text = text.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+    if parsed is None:
+        image, mime = await preprocess_image(raw, mime)
+        b64 = base64.b64encode(image).decode()
 
-    try:
-        parsed = json.loads(text)
-    except json.JSONDecodeError:
-        parsed = {
-            "time": "12:00",
-            "title": filename or "Photo",
-            "emoji": "\U0001f4f8",
-            "description": text,
-        }
+        result = await runner.run(
+            model="anthropic/claude-sonnet-4-5-20250929",
+            input=[
+                {"role": "user", "content": [
+                    {"type": "text", "text": prompt},
+                    {"type": "image_url", "image_url": {
+                        "url": f"data:{mime};base64,{b64}",
+                    }},
+                ]},
+            ],
+            max_steps=1,
+        )
+
+        text = result.final_output or ""
+        text = text.strip()
+        if text.startswith("```"):
+            text = text.split("\n", 1)[-1].rsplit("```", 1)[0].strip()
+
+        try:
+            parsed = json.loads(text)
+            if isinstance(parsed, dict):
+                await photo_analysis_cache.aset(cache_key, parsed)
+        except json.JSONDecodeError:
+            parsed = {
+                "time": "12:00",
+                "title": filename or "Photo",
+                "emoji": "\U0001f4f8",
+                "description": text,
+            }
 
     # EXIF time takes priority over AI-estimated time
     final_time = exif_time or parsed.get("time", "12:00")
@@ -882,67 +1400,95 @@ async def _analyze_one(raw: bytes, mime: str, filename: str) -> dict:
     return event
 
 
+PHOTO_UPLOAD_CONCURRENCY = int(os.getenv("PHOTO_UPLOAD_CONCURRENCY", "10"))
+
+
+async def _upload_and_analyze_one(
+    raw: bytes, mime: str, fname: str, exif: dict, sem: asyncio.Semaphore,
+) -> tuple[dict, dict]:
+    """Upload one file to storage and analyze it concurrently.
+
+    Returns (photo, event) in the shapes upload_and_analyze_photos responds with.
+    """
+    async with sem:
+        url, analysis = await asyncio.gather(
+            upload_photo_to_storage(raw, fname, mime),
+            _analyze_one(raw, mime, fname, exif),
+            return_exceptions=True,
+        )
+
+    if isinstance(url, Exception):
+        photo = {"url": None, "filename": fname, "error": str(url)}
+    else:
+        photo = {"url": url, "filename": fname}
+
+    if isinstance(analysis, Exception):
+        event = {
+            "time": "12:00",
+            "title": fname or "Photo",
+            "emoji": "\U0001f4f8",
+            "description": str(analysis),
+            "source": "photo",
+        }
+    else:
+        event = analysis
+        if photo["url"]:
+            event["photo_url"] = photo["url"]
+    return photo, event
+
+
 @app.post("/api/photos/upload")
 async def upload_and_analyze_photos(
     files: list[UploadFile] = File(...),
     date: str = Query(default=""),
     user_id: str = Depends(get_current_user),
 ):
-    """Upload photos to Supabase Storage + analyze with AI."""
+    """Upload photos to Supabase Storage + analyze with AI.
+
+    Each file's upload and analysis run concurrently with each other and
+    with the other files, bounded by PHOTO_UPLOAD_CONCURRENCY.
+    """
     if len(files) > 10:
         raise HTTPException(status_code=400, detail="Maximum 10 images allowed")
 
-    photo_urls = []
-    analysis_tasks = []
-
-    for f in files:
-        raw = await f.read()
-        mime = f.content_type or "image/jpeg"
-        fname = f.filename or "photo.jpg"
+    diary_task = asyncio.create_task(get_or_create_diary(date, user_id=user_id)) if date else None
 
-        try:
-            url = await upload_photo_to_storage(raw, fname, mime)
-            photo_urls.append({"url": url, "filename": fname})
-        except Exception as e:
-            photo_urls.append({"url": None, "filename": fname, "error": str(e)})
+    raws = [await f.read() for f in files]
+    exifs = await extract_exif_batch(raws)
+    sem = asyncio.Semaphore(PHOTO_UPLOAD_CONCURRENCY)
 
-        analysis_tasks.append(_analyze_one(raw, mime, fname))
+    async def _indexed(i: int):
+        mime = files[i].content_type or "image/jpeg"
+        fname = files[i].filename or "photo.jpg"
+        return i, await _upload_and_analyze_one(raws[i], mime, fname, exifs[i], sem)
 
-    analyses = await asyncio.gather(*analysis_tasks, return_exceptions=True)
-
-    events = []
-    for i, a in enumerate(analyses):
-        if isinstance(a, Exception):
-            events.append({
-                "time": "12:00",
-                "title": files[i].filename or "Photo",
-                "emoji": "\U0001f4f8",
-                "description": str(a),
-                "source": "photo",
-            })
-        else:
-            if i < len(photo_urls) and photo_urls[i].get("url"):
-                a["photo_url"] = photo_urls[i]["url"]
-            events.append(a)
+    photo_urls: list[dict] = [{}] * len(files)
+    events: list[dict] = [{}] * len(files)
+    for done in asyncio.as_completed([_indexed(i) for i in range(len(files))]):
+        i, (photo, event) = await done
+        photo_urls[i] = photo
+        events[i] = event
 
     diary_id = None
-    if date:
-        diary = await get_or_create_diary(date, user_id=user_id)
+    if diary_task:
+        diary = await diary_task
         diary_id = diary["id"]
-        for i, ev in enumerate(events):
-            url = photo_urls[i].get("url") if i < len(photo_urls) else None
-            if url:
-                try:
-                    await db_save_photo_event(diary_id, {
-                        "photo_url": url,
-                        "ai_analysis": ev.get("description", ""),
-                        "time": ev.get("time", "12:00"),
-                        "emoji": ev.get("emoji", "\U0001f4f8"),
-                        "title": ev.get("title", "Photo"),
-                        "description": ev.get("description", ""),
-                    })
-                except Exception:
-                    pass
+        saved_idx = [i for i, p in enumerate(photo_urls) if p.get("url")]
+        results = await db_save_photo_events(diary_id, [
+            {
+                "photo_url": photo_urls[i]["url"],
+                "ai_analysis": events[i].get("description", ""),
+                "time": events[i].get("time", "12:00"),
+                "emoji": events[i].get("emoji", "\U0001f4f8"),
+                "title": events[i].get("title", "Photo"),
+                "description": events[i].get("description", ""),
+            }
+            for i in saved_idx
+        ])
+        for i, res in zip(saved_idx, results):
+            photo_urls[i]["saved"] = res["ok"]
+            if not res["ok"]:
+                photo_urls[i]["error"] = res["error"]
 
     return {"photos": photo_urls, "events": events, "diary_id": diary_id}
 
@@ -956,12 +1502,13 @@ async def analyze_photos(
     if len(files) > 5:
         raise HTTPException(status_code=400, detail="Maximum 5 images allowed")
 
+    raws = [await f.read() for f in files]
+    exifs = await extract_exif_batch(raws)
     analysis_tasks = []
-    for f in files:
-        raw = await f.read()
+    for f, raw, exif in zip(files, raws, exifs):
         mime = f.content_type or "image/jpeg"
         fname = f.filename or "photo.jpg"
-        analysis_tasks.append(_analyze_one(raw, mime, fname))
+        analysis_tasks.append(_analyze_one(raw, mime, fname, exif))
 
     analyses = await asyncio.gather(*analysis_tasks, return_exceptions=True)
 
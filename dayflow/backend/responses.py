@@ -0,0 +1,221 @@
+"""Response serialization and compression.
+
+``FastJSONResponse`` renders with orjson. It is the app's default response
+class, and endpoints that already hold plain dicts/lists from db.py return it
+directly to skip FastAPI's ``jsonable_encoder`` walk.
+
+``CompressionMiddleware`` compresses responses of at least
+``COMPRESSION_MIN_BYTES``, negotiating brotli (when the optional ``brotli``
+package is installed) or gzip from ``Accept-Encoding`` q-values. Streaming bodies are
+compressed chunk by chunk.
+
+``negotiate_encoding``/``encode_body`` let a caller that caches a body keep
+its compressed variants too; responses that already carry Content-Encoding
+pass through the middleware untouched.
+
+``ndjson_stream`` turns an async iterator of dicts into NDJSON chunks for a
+``StreamingResponse``, optionally as a gzip file.
+"""
+
+import os
+import zlib
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (UTF-8, compact, non-str dict keys allowed)."""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+async def ndjson_stream(items, gzip: bool = False, lines_per_chunk: int = 50):
+    """Encode an async iterator of dicts as NDJSON, optionally gzip-compressed.
+
+    Lines are grouped into chunks (flushed each time when compressing), so
+    only one chunk is held in memory regardless of how many items there are.
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) if gzip else None
+    buf: list[bytes] = []
+
+    def _emit(final: bool = False) -> bytes:
+        data = b"".join(buf)
+        buf.clear()
+        if compressor is None:
+            return data
+        return compressor.compress(data) + compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+    async for item in items:
+        buf.append(orjson.dumps(item, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE))
+        if len(buf) >= lines_per_chunk:
+            yield _emit()
+    tail = _emit(final=True)
+    if tail:
+        yield tail
+
+
+# Already compressed (or event streams, which must not be buffered)
+_SKIP_CONTENT_TYPES = ("application/gzip", "application/zip", "image/", "video/", "audio/",
+                       "text/event-stream")
+
+
+def _accepted_codings(scope) -> dict[str, float]:
+    """Parse Accept-Encoding into {coding: q}; a missing q means 1."""
+    codings = {}
+    for part in Headers(scope=scope).get("accept-encoding", "").split(","):
+        coding, *params = [p.strip() for p in part.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[coding.lower()] = q
+    return codings
+
+
+def _negotiate(scope, offered: list[str]) -> str | None:
+    """Highest-q coding from ``offered`` (in server preference order for ties), or None."""
+    accepted = _accepted_codings(scope)
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = accepted.get(coding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def negotiate_encoding(scope, size: int) -> str | None:
+    """The coding CompressionMiddleware would pick for a ``size``-byte body."""
+    if size < COMPRESSION_MIN_BYTES:
+        return None
+    return _negotiate(scope, ["br", "gzip"] if brotli is not None else ["gzip"])
+
+
+def encode_body(body: bytes, coding: str) -> bytes:
+    """Compress a complete body with ``coding`` ("br" or "gzip")."""
+    stream = _BrotliStream(BROTLI_QUALITY) if coding == "br" else _GzipStream(GZIP_LEVEL)
+    return stream.chunk(body) + stream.finish()
+
+
+class _GzipStream:
+    def __init__(self, level: int):
+        self._z = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._z.compress(data) + self._z.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._z.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality: int):
+        self._c = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._c.process(data) + self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+class CompressionMiddleware:
+    """Compress with the client's highest-q coding among brotli (if installed) and gzip."""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES,
+                 gzip_level: int = GZIP_LEVEL, brotli_quality: int = BROTLI_QUALITY):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            coding = _negotiate(scope, ["br", "gzip"] if brotli is not None else ["gzip"])
+            if coding == "br":
+                stream = lambda: _BrotliStream(self.brotli_quality)  # noqa: E731
+                await _Responder(self.app, "br", stream, self.minimum_size)(scope, receive, send)
+                return
+            if coding == "gzip":
+                stream = lambda: _GzipStream(self.gzip_level)  # noqa: E731
+                await _Responder(self.app, "gzip", stream, self.minimum_size)(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
+
+
+class _Responder:
+    def __init__(self, app, encoding: str, make_stream, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.make_stream = make_stream
+        self.minimum_size = minimum_size
+        self.send = None
+        self.start_message = None
+        self.passthrough = False
+        self.stream = None
+
+    async def __call__(self, scope, receive, send):
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message):
+        if message["type"] == "http.response.start":
+            # Hold the headers until the first body chunk decides the encoding
+            headers = Headers(raw=message["headers"])
+            self.start_message = message
+            self.passthrough = (
+                "content-encoding" in headers
+                or headers.get("content-type", "").startswith(_SKIP_CONTENT_TYPES)
+            )
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.start_message is not None:
+            start, self.start_message = self.start_message, None
+            if self.passthrough or (not more_body and len(body) < self.minimum_size):
+                self.passthrough = True
+                await self.send(start)
+                await self.send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+            self.stream = self.make_stream()
+            if not more_body:
+                body = self.stream.chunk(body) + self.stream.finish()
+                headers["Content-Length"] = str(len(body))
+                await self.send(start)
+                await self.send({"type": "http.response.body", "body": body})
+                return
+            del headers["Content-Length"]
+            await self.send(start)
+
+        if self.passthrough:
+            await self.send(message)
+            return
+        chunk = self.stream.chunk(body)
+        if not more_body:
+            chunk += self.stream.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,9 @@
+-- Google Calendar incremental sync state (one nextSyncToken per user calendar)
+-- Run this in Supabase SQL Editor
+create table if not exists calendar_sync_state (
+  user_id       uuid not null,
+  calendar_id   text not null,
+  sync_token    text,          -- null forces a full resync on the next fetch
+  synced_at     timestamptz default now(),
+  primary key (user_id, calendar_id)
+);
@@ -0,0 +1,64 @@
+-- Keyset-paginated diary history for one user, newest first.
+-- p_before is the cursor (the last date of the previous page); p_summary
+-- returns only the fields a history card needs. Soft-deleted timeline events
+-- are filtered and the cover photo (earliest extracted_time) is picked here
+-- rather than in Python. Called from db.get_diary_history via supabase.rpc().
+-- Reads diaries.event_count, so run maintain_diary_totals.sql first.
+-- Run this in Supabase SQL Editor
+create index if not exists idx_diaries_user_date on diaries(user_id, date desc);
+
+create or replace function get_diary_history(
+  p_user_id uuid,
+  p_before date default null,
+  p_limit int default 30,
+  p_summary boolean default false
+)
+returns jsonb
+language sql
+stable
+as $$
+  select coalesce(jsonb_agg(page.item order by page.date desc), '[]'::jsonb)
+  from (
+    select
+      d.date,
+      case when p_summary then
+        jsonb_build_object(
+          'id', d.id,
+          'date', d.date,
+          'diary_preview', d.diary_preview,
+          'primary_emoji', d.primary_emoji,
+          'total_spending', d.total_spending,
+          'event_count', d.event_count,
+          'photo_url', cover.url
+        )
+      else
+        to_jsonb(d) || jsonb_build_object(
+          'photo_url', cover.url,
+          'timeline_events', coalesce((
+            select jsonb_agg(jsonb_build_object(
+              'id', e.id, 'time', e.time, 'emoji', e.emoji, 'title', e.title,
+              'spending', e.spending, 'source', e.source, 'is_deleted', e.is_deleted
+            ))
+            from timeline_events e
+            where e.diary_id = d.id and not e.is_deleted
+          ), '[]'::jsonb),
+          'photos', coalesce((
+            select jsonb_agg(jsonb_build_object('url', p.url, 'extracted_time', p.extracted_time))
+            from photos p
+            where p.diary_id = d.id
+          ), '[]'::jsonb)
+        )
+      end as item
+    from diaries d
+    left join lateral (
+      select p.url from photos p
+      where p.diary_id = d.id
+      order by coalesce(p.extracted_time, '00:00')
+      limit 1
+    ) cover on true
+    where (p_user_id is null or d.user_id = p_user_id)
+      and (p_before is null or d.date < p_before)
+    order by d.date desc
+    limit p_limit
+  ) page;
+$$;
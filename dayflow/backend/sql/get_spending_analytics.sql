@@ -0,0 +1,85 @@
+-- Spending rollups for one user over an inclusive date range.
+-- Returns daily totals (every day in the range, zero-filled) with a trailing
+-- p_window-day rolling average, ISO-week and calendar-month totals, and
+-- per-category / per-source breakdowns, all aggregated here so clients never
+-- download raw history. Soft-deleted events are excluded.
+-- Day totals come from the diaries' maintained aggregates; only the
+-- breakdowns read timeline_events.
+-- Called from db.get_spending_analytics via supabase.rpc(); needs the
+-- category column from save_diary_graph.sql and maintain_diary_totals.sql.
+-- Run this in Supabase SQL Editor
+create index if not exists idx_timeline_events_active_spending
+  on timeline_events(diary_id) include (spending, category, source)
+  where not is_deleted;
+
+create or replace function get_spending_analytics(
+  p_user_id uuid,
+  p_start date,
+  p_end date,
+  p_window int default 7
+)
+returns jsonb
+language sql
+stable
+as $$
+  with events as (
+    select d.date, e.spending,
+           coalesce(e.category, 'uncategorized') as category,
+           coalesce(e.source, 'generated') as source
+    from diaries d
+    join timeline_events e on e.diary_id = d.id and not e.is_deleted
+    where d.user_id = p_user_id and d.date between p_start and p_end
+  ),
+  per_day as (
+    select date, total_spending as total, event_count as events
+    from diaries
+    where user_id = p_user_id and date between p_start and p_end
+  ),
+  days as (
+    select g::date as date, coalesce(p.total, 0)::bigint as total, coalesce(p.events, 0)::int as events
+    from generate_series(p_start, p_end, interval '1 day') g
+    left join per_day p on p.date = g::date
+  ),
+  daily as (
+    select date, total, events,
+           round(avg(total) over (order by date rows between p_window - 1 preceding and current row), 2)
+             as rolling_avg
+    from days
+  )
+  select jsonb_build_object(
+    'start', p_start,
+    'end', p_end,
+    'window', p_window,
+    'total', (select coalesce(sum(total), 0) from days),
+    'events', (select coalesce(sum(events), 0) from days),
+    'daily_avg', (select round(coalesce(avg(total), 0), 2) from days),
+    'daily', (
+      select coalesce(jsonb_agg(jsonb_build_object(
+        'date', date, 'total', total, 'events', events, 'rolling_avg', rolling_avg
+      ) order by date), '[]'::jsonb)
+      from daily
+    ),
+    'weekly', (
+      select coalesce(jsonb_agg(jsonb_build_object('week_start', week_start, 'total', total)
+                                order by week_start), '[]'::jsonb)
+      from (select date_trunc('week', date)::date as week_start, sum(total) as total
+            from days group by 1) w
+    ),
+    'monthly', (
+      select coalesce(jsonb_agg(jsonb_build_object('month', month, 'total', total)
+                                order by month), '[]'::jsonb)
+      from (select to_char(date, 'YYYY-MM') as month, sum(total) as total
+            from days group by 1) m
+    ),
+    'by_category', (
+      select coalesce(jsonb_agg(jsonb_build_object('category', category, 'total', total, 'events', n)
+                                order by total desc, category), '[]'::jsonb)
+      from (select category, sum(spending) as total, count(*) as n from events group by 1) c
+    ),
+    'by_source', (
+      select coalesce(jsonb_agg(jsonb_build_object('source', source, 'total', total, 'events', n)
+                                order by total desc, source), '[]'::jsonb)
+      from (select source, sum(spending) as total, count(*) as n from events group by 1) s
+    )
+  );
+$$;
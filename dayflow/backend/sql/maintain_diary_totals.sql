@@ -0,0 +1,104 @@
+-- Keep each diary's aggregates in step with its timeline.
+-- total_spending and event_count cover active (not soft-deleted) events.
+-- Statement-level triggers read the changed rows from transition tables and
+-- apply one summed delta per diary, so a bulk write of N events touches each
+-- diary row once, inside the writing transaction.
+-- primary_emoji is (re)picked from the diary's first active event (by time)
+-- when it is empty, or when the event(s) it came from were deleted or
+-- soft-deleted and no active event still carries it. Emojis that never came
+-- from an event (e.g. chosen with the diary text) are left alone.
+-- diaries.total_spending is therefore derived: db.py no longer writes it.
+-- timeline_events.is_deleted becomes NOT NULL DEFAULT false so every reader
+-- (these triggers, history, analytics) can filter on `not is_deleted` alike.
+-- Run this in Supabase SQL Editor
+alter table diaries add column if not exists event_count int not null default 0;
+
+update timeline_events set is_deleted = false where is_deleted is null;
+alter table timeline_events
+  alter column is_deleted set default false,
+  alter column is_deleted set not null;
+
+create or replace function public.apply_timeline_totals()
+returns trigger as $$
+declare
+  removed timeline_events[] := '{}';
+  added timeline_events[] := '{}';
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    select coalesce(array_agg(o), '{}') into removed
+    from old_rows o where not o.is_deleted;
+  end if;
+  if tg_op in ('INSERT', 'UPDATE') then
+    select coalesce(array_agg(n), '{}') into added
+    from new_rows n where not n.is_deleted;
+  end if;
+
+  with delta as (
+    select diary_id, sum(spending) as spending, sum(n) as n
+    from (
+      select diary_id, -coalesce(spending, 0) as spending, -1 as n from unnest(removed)
+      union all
+      select diary_id, coalesce(spending, 0), 1 from unnest(added)
+    ) changes
+    group by diary_id
+  )
+  update diaries d
+  set total_spending = coalesce(d.total_spending, 0) + delta.spending,
+      event_count = d.event_count + delta.n
+  from delta
+  where d.id = delta.diary_id and (delta.spending <> 0 or delta.n <> 0);
+
+  update diaries d
+  set primary_emoji = (
+    select e.emoji from timeline_events e
+    where e.diary_id = d.id and not e.is_deleted and e.emoji is not null
+    order by e.time, e.sort_order
+    limit 1
+  )
+  where d.id in (select diary_id from unnest(removed) union select diary_id from unnest(added))
+    and (
+      d.primary_emoji is null
+      or (
+        d.primary_emoji in (select r.emoji from unnest(removed) r where r.diary_id = d.id)
+        and not exists (
+          select 1 from timeline_events e
+          where e.diary_id = d.id and not e.is_deleted and e.emoji = d.primary_emoji
+        )
+      )
+    );
+  return null;
+end;
+$$ language plpgsql;
+
+-- Transition tables need one trigger per event
+drop trigger if exists timeline_events_totals on timeline_events;
+drop trigger if exists timeline_events_totals_insert on timeline_events;
+drop trigger if exists timeline_events_totals_update on timeline_events;
+drop trigger if exists timeline_events_totals_delete on timeline_events;
+create trigger timeline_events_totals_insert
+  after insert on timeline_events
+  referencing new table as new_rows
+  for each statement execute function public.apply_timeline_totals();
+create trigger timeline_events_totals_update
+  after update on timeline_events
+  referencing old table as old_rows new table as new_rows
+  for each statement execute function public.apply_timeline_totals();
+create trigger timeline_events_totals_delete
+  after delete on timeline_events
+  referencing old table as old_rows
+  for each statement execute function public.apply_timeline_totals();
+
+-- One-time backfill so existing rows start from the right totals and emoji
+update diaries d
+set total_spending = coalesce(t.total, 0),
+    event_count = coalesce(t.n, 0),
+    primary_emoji = coalesce(d.primary_emoji, t.first_emoji)
+from (
+  select d2.id, sum(e.spending) as total, count(e.id) as n,
+         (array_agg(e.emoji order by e.time, e.sort_order) filter (where e.emoji is not null))[1]
+           as first_emoji
+  from diaries d2
+  left join timeline_events e on e.diary_id = d2.id and not e.is_deleted
+  group by d2.id
+) t
+where t.id = d.id;
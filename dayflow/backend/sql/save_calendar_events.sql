@@ -0,0 +1,79 @@
+-- Diff-based write of one day's Google Calendar events, keyed on calendar_id
+-- (idx_calendar_events_calendar_id). New events are inserted, rows are only
+-- updated when a field actually changed, and rows for the day that vanished
+-- from the feed are deleted. Called from db.save_calendar_events via supabase.rpc().
+-- Run this in Supabase SQL Editor
+create or replace function save_calendar_events(p_date date, p_diary_id uuid, p_events jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  n_deleted int;
+  n_new int;
+  n_written int;
+  keyed_rows jsonb;
+  plain_rows jsonb;
+begin
+  -- Drop this day's rows that are no longer in the feed
+  delete from calendar_events c
+  where c.date = p_date
+    and (p_diary_id is null or c.diary_id = p_diary_id)
+    and (c.calendar_id is null or not exists (
+      select 1 from jsonb_array_elements(p_events) e where e->>'calendar_id' = c.calendar_id
+    ));
+  get diagnostics n_deleted = row_count;
+
+  select count(*) into n_new
+  from jsonb_populate_recordset(null::calendar_events, p_events) i
+  where i.calendar_id is not null
+    and not exists (select 1 from calendar_events c where c.calendar_id = i.calendar_id);
+
+  insert into calendar_events (diary_id, date, title, description, start_time, end_time,
+                               location, all_day, source, calendar_id)
+  select diary_id, date, title, description, start_time, end_time, location,
+         coalesce(all_day, false), coalesce(source, 'google_calendar'), calendar_id
+  from jsonb_populate_recordset(null::calendar_events, p_events)
+  where calendar_id is not null
+  on conflict (calendar_id) where calendar_id is not null do update set
+    diary_id = excluded.diary_id,
+    date = excluded.date,
+    title = excluded.title,
+    description = excluded.description,
+    start_time = excluded.start_time,
+    end_time = excluded.end_time,
+    location = excluded.location,
+    all_day = excluded.all_day,
+    source = excluded.source
+  where (calendar_events.diary_id, calendar_events.date, calendar_events.title,
+         calendar_events.description, calendar_events.start_time, calendar_events.end_time,
+         calendar_events.location, calendar_events.all_day, calendar_events.source)
+    is distinct from
+        (excluded.diary_id, excluded.date, excluded.title, excluded.description,
+         excluded.start_time, excluded.end_time, excluded.location, excluded.all_day,
+         excluded.source);
+  get diagnostics n_written = row_count;
+
+  -- Events without a Google id cannot be matched, so they are always inserted
+  with ins as (
+    insert into calendar_events (diary_id, date, title, description, start_time, end_time,
+                                 location, all_day, source, calendar_id)
+    select diary_id, date, title, description, start_time, end_time, location,
+           coalesce(all_day, false), coalesce(source, 'google_calendar'), null
+    from jsonb_populate_recordset(null::calendar_events, p_events)
+    where calendar_id is null
+    returning *
+  )
+  select coalesce(jsonb_agg(to_jsonb(ins)), '[]'::jsonb) into plain_rows from ins;
+
+  select coalesce(jsonb_agg(to_jsonb(c) order by c.start_time), '[]'::jsonb) into keyed_rows
+  from calendar_events c
+  where c.calendar_id in (select e->>'calendar_id' from jsonb_array_elements(p_events) e);
+
+  return jsonb_build_object(
+    'events', keyed_rows || plain_rows,
+    'inserted', n_new + jsonb_array_length(plain_rows),
+    'updated', n_written - n_new,
+    'deleted', n_deleted
+  );
+end;
+$$;
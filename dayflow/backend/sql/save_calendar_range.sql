@@ -0,0 +1,42 @@
+-- Save Google Calendar events for many days in one transaction.
+-- Each element of p_days is {date, diary_id, events, timeline}: events are
+-- diffed per day by save_calendar_events (insert new, update changed, delete
+-- vanished), and timeline rows are added for calendar events the diary does
+-- not show yet. A failure rolls back every day.
+-- Called from db.save_calendar_range via supabase.rpc(); needs save_calendar_events.sql.
+-- Run this in Supabase SQL Editor
+create or replace function save_calendar_range(p_days jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  d jsonb;
+  saved jsonb;
+  n_timeline int;
+  counts jsonb := '{}'::jsonb;
+begin
+  for d in select * from jsonb_array_elements(p_days) loop
+    saved := save_calendar_events((d->>'date')::date, (d->>'diary_id')::uuid, d->'events');
+
+    insert into timeline_events (diary_id, time, emoji, title, description, location,
+                                 source, source_id, spending, is_deleted, sort_order)
+    select (d->>'diary_id')::uuid, t.time, t.emoji, t.title, t.description, t.location,
+           'calendar', t.source_id, 0, false, t.sort_order
+    from jsonb_populate_recordset(null::timeline_events, d->'timeline') t
+    where t.source_id is null or not exists (
+      select 1 from timeline_events e
+      where e.diary_id = (d->>'diary_id')::uuid
+        and e.source = 'calendar'
+        and e.source_id = t.source_id
+        and not e.is_deleted
+    );
+    get diagnostics n_timeline = row_count;
+
+    counts := counts || jsonb_build_object(d->>'date', jsonb_build_object(
+      'saved', jsonb_array_length(saved->'events'),
+      'timeline_inserted', n_timeline
+    ));
+  end loop;
+  return counts;
+end;
+$$;
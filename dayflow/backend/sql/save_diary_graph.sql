@@ -0,0 +1,101 @@
+-- Save a diary and its timeline in one transaction.
+-- Timeline events are merged by a stable event_key (computed in db.py from
+-- source/source_id, or time/title for generated events), so retrying a save
+-- updates rows in place instead of inserting duplicates. Unkeyed rows from
+-- other write paths are matched on (source, time, title) and adopt the key.
+-- total_spending is not written here: maintain_diary_totals.sql derives it
+-- from the events, and the diary is re-read after they are merged.
+-- Called from db.save_diary_graph via supabase.rpc(); needs unique_diary_per_day.sql.
+-- Run this in Supabase SQL Editor
+alter table timeline_events add column if not exists event_key text;
+alter table timeline_events add column if not exists category text;
+
+-- Not partial, so PostgREST bulk upserts (on_conflict=diary_id,event_key) can
+-- target it; rows without a key never conflict since NULLs are distinct.
+create unique index if not exists timeline_events_diary_event_key
+  on timeline_events(diary_id, event_key);
+
+create or replace function save_diary_graph(p_diary jsonb, p_events jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  d diaries;
+  event_rows jsonb;
+begin
+  -- Only the keys present in p_diary overwrite an existing row
+  insert into diaries as t (user_id, date, diary_text, diary_preview, spending_insight,
+                            tomorrow_suggestion, primary_emoji, thumb_event_id, photo_url)
+  select user_id, date, diary_text, diary_preview, spending_insight,
+         tomorrow_suggestion, primary_emoji, thumb_event_id, photo_url
+  from jsonb_populate_record(null::diaries, p_diary)
+  on conflict (user_id, date) do update set
+    diary_text = case when p_diary ? 'diary_text' then excluded.diary_text else t.diary_text end,
+    diary_preview = case when p_diary ? 'diary_preview' then excluded.diary_preview else t.diary_preview end,
+    spending_insight = case when p_diary ? 'spending_insight' then excluded.spending_insight else t.spending_insight end,
+    tomorrow_suggestion = case when p_diary ? 'tomorrow_suggestion' then excluded.tomorrow_suggestion else t.tomorrow_suggestion end,
+    primary_emoji = case when p_diary ? 'primary_emoji' then excluded.primary_emoji else t.primary_emoji end,
+    thumb_event_id = case when p_diary ? 'thumb_event_id' then excluded.thumb_event_id else t.thumb_event_id end,
+    photo_url = case when p_diary ? 'photo_url' then excluded.photo_url else t.photo_url end
+  returning * into d;
+
+  -- Rows written by other paths (calendar/photo imports, manual adds) have no
+  -- event_key, and clients echo them back without one. Adopt such a row for
+  -- an incoming event with the same source, time and title (pairing
+  -- duplicates in order) so the merge below updates it instead of adding a copy.
+  with incoming as (
+    select i.event_key,
+           row_number() over (partition by coalesce(i.source, 'generated'), i.time, i.title
+                              order by i.event_key) as rn,
+           coalesce(i.source, 'generated') as source, i.time, i.title
+    from jsonb_populate_recordset(null::timeline_events, p_events) i
+    where not exists (
+      select 1 from timeline_events t where t.diary_id = d.id and t.event_key = i.event_key
+    )
+  ),
+  unkeyed as (
+    select t.id,
+           row_number() over (partition by coalesce(t.source, 'generated'), t.time, t.title
+                              order by t.created_at, t.id) as rn,
+           coalesce(t.source, 'generated') as source, t.time, t.title
+    from timeline_events t
+    where t.diary_id = d.id and t.event_key is null
+  )
+  update timeline_events t
+  set event_key = i.event_key
+  from incoming i
+  join unkeyed u on u.source = i.source and u.time = i.time and u.title = i.title and u.rn = i.rn
+  where t.id = u.id;
+
+  -- Merge events by key; a user's soft delete survives a re-save
+  with up as (
+    insert into timeline_events as t (diary_id, event_key, time, emoji, title, description, location,
+                                      source, source_id, spending, category, is_deleted, photo_url,
+                                      photo_analysis, sort_order)
+    select d.id, event_key, time, emoji, title, description, location,
+           source, source_id, coalesce(spending, 0), category, coalesce(is_deleted, false), photo_url,
+           photo_analysis, sort_order
+    from jsonb_populate_recordset(null::timeline_events, p_events)
+    on conflict (diary_id, event_key) do update set
+      time = coalesce(excluded.time, t.time),
+      emoji = coalesce(excluded.emoji, t.emoji),
+      title = coalesce(excluded.title, t.title),
+      description = coalesce(excluded.description, t.description),
+      location = coalesce(excluded.location, t.location),
+      source = coalesce(excluded.source, t.source),
+      source_id = coalesce(excluded.source_id, t.source_id),
+      spending = excluded.spending,
+      category = coalesce(excluded.category, t.category),
+      photo_url = coalesce(excluded.photo_url, t.photo_url),
+      photo_analysis = coalesce(excluded.photo_analysis, t.photo_analysis),
+      sort_order = coalesce(excluded.sort_order, t.sort_order)
+    returning *
+  )
+  select coalesce(jsonb_agg(to_jsonb(up) order by up.time), '[]'::jsonb) into event_rows from up;
+
+  -- Pick up the totals the timeline trigger just applied
+  select * into d from diaries where id = d.id;
+
+  return to_jsonb(d) || jsonb_build_object('timeline_events', event_rows);
+end;
+$$;
@@ -0,0 +1,33 @@
+-- Bulk-save analyzed photos and their timeline events in one transaction.
+-- Called from db.save_photo_events via supabase.rpc(); photo ids are generated
+-- client-side so each timeline row can reference its photo (source_id).
+-- Run this in Supabase SQL Editor
+create or replace function save_photo_events(p_photos jsonb, p_events jsonb)
+returns jsonb
+language plpgsql
+as $$
+declare
+  photo_rows jsonb;
+  event_rows jsonb;
+begin
+  with ins as (
+    insert into photos (id, diary_id, url, thumbnail_url, ai_analysis, extracted_time, extracted_location)
+    select id, diary_id, url, thumbnail_url, ai_analysis, extracted_time, extracted_location
+    from jsonb_populate_recordset(null::photos, p_photos)
+    returning *
+  )
+  select coalesce(jsonb_agg(to_jsonb(ins)), '[]'::jsonb) into photo_rows from ins;
+
+  with ins as (
+    insert into timeline_events (diary_id, time, emoji, title, description, location, source,
+                                 source_id, photo_url, photo_analysis, spending, is_deleted)
+    select diary_id, time, emoji, title, description, location, source,
+           source_id, photo_url, photo_analysis, spending, coalesce(is_deleted, false)
+    from jsonb_populate_recordset(null::timeline_events, p_events)
+    returning *
+  )
+  select coalesce(jsonb_agg(to_jsonb(ins)), '[]'::jsonb) into event_rows from ins;
+
+  return jsonb_build_object('photos', photo_rows, 'events', event_rows);
+end;
+$$;
@@ -1,6 +1,8 @@
 -- ============================================================
 -- DayFlow: Demo Diary Data for Test Users
 -- Run AFTER setup_users.sql in Supabase SQL Editor
+-- total_spending is left to the maintain_diary_totals.sql triggers, which
+-- sum the timeline events inserted below.
 -- ============================================================
 
 -- Helper: get user IDs by email
@@ -21,13 +23,13 @@ select id into charlie_id from auth.users where email = 'charlie@test.com';
 -- ════════════════════════════════════════════════════════════
 
 -- Alice: Feb 5
-insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, total_spending, primary_emoji)
+insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, primary_emoji)
 values (gen_random_uuid(), '2026-02-05', alice_id,
   'Started the morning with a warm latte at Blue Bottle. The foam art was beautiful today. Had a productive study session at the library — finally finished my ML assignment. Grabbed ramen with Sarah for lunch, we talked about summer internships. Spent the afternoon coding at the hackathon prep meeting. Ended the day with a sunset walk along the Cut.',
   'Morning latte, ML homework, ramen with Sarah...',
   'Spent $28.50 today — mostly on food. Coffee habit adds up!',
   'Pack lunch tomorrow to save on food expenses.',
-  29, '☕')
+  '☕')
 returning id into d_id;
 
 insert into timeline_events (diary_id, time, emoji, title, description, spending, location, source, is_deleted) values
@@ -39,13 +41,13 @@ insert into timeline_events (diary_id, time, emoji, title, description, spending
   (d_id, '19:00', '🍕', 'Dinner — leftover pizza', 'Quick dinner at home', 8.5, 'Home', 'manual', false);
 
 -- Alice: Feb 6
-insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, total_spending, primary_emoji)
+insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, primary_emoji)
 values (gen_random_uuid(), '2026-02-06', alice_id,
   'TartanHack day! Woke up early and grabbed a bagel on the way. Spent the entire day at the hackathon building DayFlow with the team. We got the calendar integration working which felt amazing. Had pizza for dinner (free hackathon food!). Late night coding session until 2am.',
   'TartanHack all day! Built DayFlow...',
   'Only spent $4.50 today thanks to free hackathon food!',
   'Remember to sleep — hackathons are fun but rest matters.',
-  5, '🚀')
+  '🚀')
 returning id into d_id;
 
 insert into timeline_events (diary_id, time, emoji, title, description, spending, location, source, is_deleted) values
@@ -58,13 +60,13 @@ insert into timeline_events (diary_id, time, emoji, title, description, spending
   (d_id, '20:00', '🤖', 'AI diary generation', 'Integrated Dedalus for diary writing', 0, 'Cohon Center', 'calendar', false);
 
 -- Alice: Feb 7
-insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, total_spending, primary_emoji)
+insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, primary_emoji)
 values (gen_random_uuid(), '2026-02-07', alice_id,
   'Final day of TartanHack. Polished the demo and submitted at noon. Our DayFlow project got great feedback from judges! Celebrated with bubble tea after. Took the rest of the afternoon to rest. Called mom in the evening — she was happy to hear about the hackathon.',
   'TartanHack submission day! Great feedback...',
   'Spent $12 — bubble tea celebration was worth it.',
   'Take it easy this weekend, you earned it.',
-  12, '🏆')
+  '🏆')
 returning id into d_id;
 
 insert into timeline_events (diary_id, time, emoji, title, description, spending, location, source, is_deleted) values
@@ -80,13 +82,13 @@ insert into timeline_events (diary_id, time, emoji, title, description, spending
 -- ════════════════════════════════════════════════════════════
 
 -- Bob: Feb 5
-insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, total_spending, primary_emoji)
+insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, primary_emoji)
 values (gen_random_uuid(), '2026-02-05', bob_id,
   'Had a chill day today. Morning gym session felt great — hit a new PR on bench press. Grabbed a smoothie after. Attended the algorithms lecture which was actually interesting for once. Met up with the study group to work on the group project. Cooked bibimbap for dinner.',
   'Gym PR, algorithms class, bibimbap dinner...',
   'Spent $15 — gym smoothie was pricey but needed the protein.',
   'Start working on the OS project — deadline is next week.',
-  15, '🏋️')
+  '🏋️')
 returning id into d_id;
 
 insert into timeline_events (diary_id, time, emoji, title, description, spending, location, source, is_deleted) values
@@ -98,13 +100,13 @@ insert into timeline_events (diary_id, time, emoji, title, description, spending
   (d_id, '19:00', '🍚', 'Cooked bibimbap', 'Made it from scratch — turned out great', 0, 'Home', 'manual', false);
 
 -- Bob: Feb 6
-insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, total_spending, primary_emoji)
+insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, primary_emoji)
 values (gen_random_uuid(), '2026-02-06', bob_id,
   'Woke up late, skipped the morning class (oops). Spent most of the day at TartanHack helping friends with their project. The energy there was amazing. Had free food all day which was nice. Evening basketball game with the boys — we won! Watched a movie before bed.',
   'TartanHack vibes, basketball win, movie night...',
   'Zero spending today! Free hackathon food for the win.',
   'Dont skip class again — check lecture notes online.',
-  0, '🏀')
+  '🏀')
 returning id into d_id;
 
 insert into timeline_events (diary_id, time, emoji, title, description, spending, location, source, is_deleted) values
@@ -120,13 +122,13 @@ insert into timeline_events (diary_id, time, emoji, title, description, spending
 -- ════════════════════════════════════════════════════════════
 
 -- Charlie: Feb 6
-insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, total_spending, primary_emoji)
+insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, primary_emoji)
 values (gen_random_uuid(), '2026-02-06', charlie_id,
   'Beautiful day for photography! Took my camera out in the morning to shoot the frost on campus. The light was perfect around 8am. Had a productive design review for the capstone project. Tried the new Thai place on Craig Street for lunch — the pad thai was incredible. Spent the evening editing photos in Lightroom.',
   'Morning photography, design review, Thai food...',
   'Spent $22 — the new Thai place was worth it though.',
   'Submit the edited photos to the campus magazine by Friday.',
-  22, '📸')
+  '📸')
 returning id into d_id;
 
 insert into timeline_events (diary_id, time, emoji, title, description, spending, location, source, is_deleted) values
@@ -138,13 +140,13 @@ insert into timeline_events (diary_id, time, emoji, title, description, spending
   (d_id, '19:00', '🖥️', 'Photo editing session', 'Edited morning shots in Lightroom', 0, 'Home', 'manual', false);
 
 -- Charlie: Feb 7
-insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, total_spending, primary_emoji)
+insert into diaries (id, date, user_id, diary_text, diary_preview, spending_insight, tomorrow_suggestion, primary_emoji)
 values (gen_random_uuid(), '2026-02-07', charlie_id,
   'Lazy Saturday morning — slept in and made pancakes. Went to the CMU art gallery with friends in the afternoon. The new exhibition on generative art was mind-blowing. Stopped by the bookstore and picked up a typography book. Cooked dinner at home and worked on personal website redesign.',
   'Pancakes, art gallery, typography book...',
   'Spent $35 — the typography book was an impulse buy but no regrets.',
   'Start reading the typography book this weekend.',
-  35, '🎨')
+  '🎨')
 returning id into d_id;
 
 insert into timeline_events (diary_id, time, emoji, title, description, spending, location, source, is_deleted) values
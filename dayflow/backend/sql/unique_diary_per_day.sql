@@ -0,0 +1,83 @@
+-- One diary per user per day, plus a race-free get-or-create.
+-- Run this in Supabase SQL Editor
+
+-- 1. Fold existing duplicate (user_id, date) diaries into one survivor. A
+-- later save may have landed in either duplicate, so the row with the most
+-- content wins (then the oldest), and any column it lacks is filled from
+-- the others before they are deleted.
+create temporary table diary_dupes as
+select id, keep_id
+from (
+  select id, first_value(id) over (
+    partition by user_id, date
+    order by num_nonnulls(diary_text, diary_preview, spending_insight, tomorrow_suggestion,
+                          primary_emoji, thumb_event_id, photo_url) desc,
+             created_at, id
+  ) as keep_id
+  from diaries
+  where user_id is not null
+) ranked
+where id <> keep_id;
+
+update diaries k set
+  diary_text = coalesce(k.diary_text, f.diary_text),
+  diary_preview = coalesce(k.diary_preview, f.diary_preview),
+  spending_insight = coalesce(k.spending_insight, f.spending_insight),
+  tomorrow_suggestion = coalesce(k.tomorrow_suggestion, f.tomorrow_suggestion),
+  primary_emoji = coalesce(k.primary_emoji, f.primary_emoji),
+  thumb_event_id = coalesce(k.thumb_event_id, f.thumb_event_id),
+  photo_url = coalesce(k.photo_url, f.photo_url),
+  total_spending = coalesce(nullif(k.total_spending, 0), f.total_spending, k.total_spending)
+from (
+  select dd.keep_id,
+    (array_agg(x.diary_text order by x.created_at) filter (where x.diary_text is not null))[1] as diary_text,
+    (array_agg(x.diary_preview order by x.created_at) filter (where x.diary_preview is not null))[1] as diary_preview,
+    (array_agg(x.spending_insight order by x.created_at) filter (where x.spending_insight is not null))[1] as spending_insight,
+    (array_agg(x.tomorrow_suggestion order by x.created_at) filter (where x.tomorrow_suggestion is not null))[1] as tomorrow_suggestion,
+    (array_agg(x.primary_emoji order by x.created_at) filter (where x.primary_emoji is not null))[1] as primary_emoji,
+    (array_agg(x.thumb_event_id order by x.created_at) filter (where x.thumb_event_id is not null))[1] as thumb_event_id,
+    (array_agg(x.photo_url order by x.created_at) filter (where x.photo_url is not null))[1] as photo_url,
+    max(nullif(x.total_spending, 0)) as total_spending
+  from diary_dupes dd
+  join diaries x on x.id = dd.id
+  group by dd.keep_id
+) f
+where k.id = f.keep_id;
+
+update timeline_events t set diary_id = d.keep_id from diary_dupes d where t.diary_id = d.id;
+update photos p set diary_id = d.keep_id from diary_dupes d where p.diary_id = d.id;
+update calendar_events c set diary_id = d.keep_id from diary_dupes d where c.diary_id = d.id;
+delete from diaries where id in (select id from diary_dupes);
+drop table diary_dupes;
+
+-- 2. Enforce it (also serves the history keyset scan, replacing the plain index)
+create unique index if not exists diaries_user_id_date_key on diaries(user_id, date);
+drop index if exists idx_diaries_user_date;
+
+-- 3. Get-or-create many dates in one call. Called from db.get_or_create_diary(ies)
+-- via supabase.rpc(). The insert and the select are separate statements so the
+-- select also sees rows a concurrent caller committed while we waited on the
+-- unique index. Each row carries "created" = true if this call inserted it.
+create or replace function get_or_create_diaries(p_user_id uuid, p_dates date[])
+returns jsonb
+language plpgsql
+as $$
+declare
+  created_ids uuid[];
+begin
+  with ins as (
+    insert into diaries (user_id, date)
+    select p_user_id, d from unnest(p_dates) as d
+    on conflict (user_id, date) do nothing
+    returning id
+  )
+  select coalesce(array_agg(id), '{}') into created_ids from ins;
+
+  return (
+    select coalesce(jsonb_agg(to_jsonb(d) || jsonb_build_object('created', d.id = any(created_ids))
+                              order by d.date), '[]'::jsonb)
+    from diaries d
+    where d.user_id = p_user_id and d.date = any(p_dates)
+  );
+end;
+$$;
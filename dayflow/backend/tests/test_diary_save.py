@@ -0,0 +1,44 @@
+"""Regression: saving a diary after a calendar import must not duplicate events."""
+
+import asyncio
+import os
+
+os.environ["DB_BACKEND"] = "memory"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+import db  # noqa: E402
+import main  # noqa: E402
+
+USER_ID = "11111111-1111-1111-1111-111111111111"
+HEADERS = {"X-User-Id": USER_ID}
+
+
+def test_save_after_calendar_import_merges_events():
+    client = TestClient(main.app)
+    date = "2025-03-02"
+    diary_ids = asyncio.run(db.get_or_create_diaries([date], USER_ID))
+    lunch = {"title": "Lunch", "start_time": "2025-03-02T12:00:00-05:00", "calendar_id": "g-lunch", "emoji": "🍜"}
+    asyncio.run(db.save_calendar_range({date: [lunch]}, diary_ids))
+
+    # What the frontend sends back: source, time and title, no source_id/event_key
+    payload = {
+        "date": date,
+        "diary": {
+            "diary_text": "Lunch out",
+            "total_spending": 20,
+            "timeline": [{"time": "12:00", "emoji": "🍜", "title": "Lunch", "spending": 20, "source": "calendar"}],
+        },
+    }
+    for _ in range(2):
+        saved = client.post("/api/diary/save", json=payload, headers=HEADERS)
+        assert saved.status_code == 200
+
+    body = saved.json()
+    events = [(e["title"], e["spending"], e["source_id"]) for e in body["timeline_events"]]
+    assert events == [("Lunch", 20, "g-lunch")]
+    assert body["total_spending"] == 20
+    assert body["event_count"] == 1
+
+    timeline = client.get("/api/timeline", params={"diary_id": body["id"]}, headers=HEADERS).json()["timeline"]
+    assert [(e["title"], e["spending"]) for e in timeline] == [("Lunch", 20)]